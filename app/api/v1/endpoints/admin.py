@@ -2,17 +2,21 @@
 Admin Endpoints
 """
 
-from fastapi import APIRouter, HTTPException, BackgroundTasks, Request
+from fastapi import APIRouter, HTTPException, BackgroundTasks, Request, Depends
 from fastapi.responses import StreamingResponse
 from pydantic import BaseModel
-import yaml
+import asyncio
 import json
 from typing import Dict, Any, List
 
-from app.core.config import settings
+from app.core.config import settings, load_config_file, save_config_file
+from app.services.ollama import OllamaService
 
 router = APIRouter()
 
+# Serializes read-modify-write cycles on the config file
+_config_lock = asyncio.Lock()
+
 class ConfigUpdate(BaseModel):
     server: Dict[str, Any] = {}
     model: Dict[str, Any] = {}
@@ -24,12 +28,35 @@ class ConfigUpdate(BaseModel):
 class ModelPullRequest(BaseModel):
     name: str
 
+CONFIG_SECTIONS = ("server", "model", "inference", "rag", "security", "logging")
+
+def _deep_update(d: Dict[str, Any], u: Dict[str, Any]) -> Dict[str, Any]:
+    """Merge u into d in place using an explicit stack"""
+    stack = [(d, u)]
+    while stack:
+        dst, src = stack.pop()
+        for k, v in src.items():
+            if isinstance(v, dict):
+                nested = dst.get(k)
+                if not isinstance(nested, dict):
+                    nested = dst[k] = {}
+                stack.append((nested, v))
+            else:
+                dst[k] = v
+    return d
+
+async def require_ollama(request: Request) -> OllamaService:
+    """Dependency that returns the Ollama service or fails with 503"""
+    ollama_service = getattr(request.app.state, "ollama_service", None)
+    if not ollama_service:
+        raise HTTPException(status_code=503, detail="Ollama service not initialized")
+    return ollama_service
+
 @router.get("/config")
 async def get_config():
     """Get current server configuration"""
     try:
-        with open("config/server_config.yaml", "r") as f:
-            return yaml.safe_load(f)
+        return await asyncio.to_thread(load_config_file)
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Failed to read config: {str(e)}")
 
@@ -42,33 +69,21 @@ async def update_config(config: ConfigUpdate):
         # To preserve comments we'd need a more advanced yaml parser like ruamel.yaml,
         # but standard pyyaml is what we have.
         
-        current_config = {}
-        try:
-            with open("config/server_config.yaml", "r") as f:
-                current_config = yaml.safe_load(f) or {}
-        except FileNotFoundError:
-            pass
-
-        # Deep update helper
-        def deep_update(d, u):
-            for k, v in u.items():
-                if isinstance(v, dict):
-                    d[k] = deep_update(d.get(k, {}), v)
-                else:
-                    d[k] = v
-            return d
-
-        # Update sections
-        if config.server: deep_update(current_config.setdefault('server', {}), config.server)
-        if config.model: deep_update(current_config.setdefault('model', {}), config.model)
-        if config.inference: deep_update(current_config.setdefault('inference', {}), config.inference)
-        if config.rag: deep_update(current_config.setdefault('rag', {}), config.rag)
-        if config.security: deep_update(current_config.setdefault('security', {}), config.security)
-        if config.logging: deep_update(current_config.setdefault('logging', {}), config.logging)
-
-        # Write back
-        with open("config/server_config.yaml", "w") as f:
-            yaml.dump(current_config, f, default_flow_style=False)
+        async with _config_lock:
+            current_config = {}
+            try:
+                current_config = await asyncio.to_thread(load_config_file)
+            except FileNotFoundError:
+                pass
+
+            # Update sections
+            for section in CONFIG_SECTIONS:
+                values = getattr(config, section)
+                if values:
+                    _deep_update(current_config.setdefault(section, {}), values)
+
+            # Write back
+            await asyncio.to_thread(save_config_file, current_config)
             
         return {"status": "success", "message": "Configuration updated. Please restart the server for changes to take effect."}
         
@@ -76,19 +91,13 @@ async def update_config(config: ConfigUpdate):
         raise HTTPException(status_code=500, detail=f"Failed to update config: {str(e)}")
 
 @router.get("/models")
-async def list_models(request: Request):
+async def list_models(ollama_service: OllamaService = Depends(require_ollama)):
     """List available models"""
-    if not hasattr(request.app.state, "ollama_service") or not request.app.state.ollama_service:
-        raise HTTPException(status_code=503, detail="Ollama service not initialized")
-    return await request.app.state.ollama_service.list_models()
+    return await ollama_service.list_models()
 
 @router.get("/status")
-async def get_status(request: Request):
+async def get_status(ollama_service: OllamaService = Depends(require_ollama)):
     """Get current service status including running model"""
-    if not hasattr(request.app.state, "ollama_service") or not request.app.state.ollama_service:
-        raise HTTPException(status_code=503, detail="Ollama service not initialized")
-    
-    ollama_service = request.app.state.ollama_service
     model_info = await ollama_service.get_model_info()
     
     return {
@@ -98,13 +107,11 @@ async def get_status(request: Request):
     }
 
 @router.post("/models/pull")
-async def pull_model(request: Request, request_body: ModelPullRequest):
+async def pull_model(
+    request_body: ModelPullRequest,
+    ollama_service: OllamaService = Depends(require_ollama)
+):
     """Pull a new model"""
-    if not hasattr(request.app.state, "ollama_service") or not request.app.state.ollama_service:
-        raise HTTPException(status_code=503, detail="Ollama service not initialized")
-    
-    ollama_service = request.app.state.ollama_service
-    
     async def generate():
         try:
             async for progress in ollama_service.pull_model(request_body.name):
@@ -115,12 +122,8 @@ async def pull_model(request: Request, request_body: ModelPullRequest):
     return StreamingResponse(generate(), media_type="application/x-ndjson")
 
 @router.post("/models/create")
-async def create_model(request: Request):
+async def create_model(ollama_service: OllamaService = Depends(require_ollama)):
     """Create the default model from Modelfile"""
-    if not hasattr(request.app.state, "ollama_service") or not request.app.state.ollama_service:
-        raise HTTPException(status_code=503, detail="Ollama service not initialized")
-    
-    ollama_service = request.app.state.ollama_service
     model_name = settings.model.model_name
     
     async def generate():
@@ -133,13 +136,10 @@ async def create_model(request: Request):
     return StreamingResponse(generate(), media_type="application/x-ndjson")
 
 @router.delete("/models/{name:path}")
-async def delete_model(name: str, request: Request):
+async def delete_model(name: str, ollama_service: OllamaService = Depends(require_ollama)):
     """Delete a model"""
-    if not hasattr(request.app.state, "ollama_service") or not request.app.state.ollama_service:
-        raise HTTPException(status_code=503, detail="Ollama service not initialized")
-    
     try:
-        success = await request.app.state.ollama_service.delete_model(name)
+        success = await ollama_service.delete_model(name)
         if success:
             return {"status": "success", "message": f"Model {name} deleted"}
         else:
@@ -151,25 +151,25 @@ async def delete_model(name: str, request: Request):
 async def activate_model(request: Request, request_body: ModelPullRequest):
     """Set a model as the active model"""
     try:
-        # Read current config
-        with open("config/server_config.yaml", "r") as f:
-            config = yaml.safe_load(f) or {}
-        
-        # Update model name
-        if 'model' not in config:
-            config['model'] = {}
-        config['model']['model_name'] = request_body.name
-        
-        # Write back
-        with open("config/server_config.yaml", "w") as f:
-            yaml.dump(config, f, default_flow_style=False)
+        async with _config_lock:
+            # Read current config
+            config = await asyncio.to_thread(load_config_file)
+            
+            # Update model name
+            if 'model' not in config:
+                config['model'] = {}
+            config['model']['model_name'] = request_body.name
+            
+            # Write back
+            await asyncio.to_thread(save_config_file, config)
         
         # Update settings in memory
         settings.model.model_name = request_body.name
         
         # Update ollama service
-        if hasattr(request.app.state, "ollama_service") and request.app.state.ollama_service:
-            request.app.state.ollama_service.model_name = request_body.name
+        ollama_service = getattr(request.app.state, "ollama_service", None)
+        if ollama_service:
+            ollama_service.model_name = request_body.name
         
         return {"status": "success", "message": f"Active model set to {request_body.name}"}
     except Exception as e:
@@ -177,25 +177,17 @@ async def activate_model(request: Request, request_body: ModelPullRequest):
 
 
 @router.post("/service/stop")
-async def stop_service(request: Request):
+async def stop_service(ollama_service: OllamaService = Depends(require_ollama)):
     """Unload current model"""
-    if not hasattr(request.app.state, "ollama_service") or not request.app.state.ollama_service:
-        raise HTTPException(status_code=503, detail="Ollama service not initialized")
-    
-    success = await request.app.state.ollama_service.unload_model()
+    success = await ollama_service.unload_model()
     if success:
         return {"status": "success", "message": "Model unloaded"}
     else:
         raise HTTPException(status_code=500, detail="Failed to unload model")
 
 @router.post("/service/load")
-async def load_service(request: Request):
+async def load_service(ollama_service: OllamaService = Depends(require_ollama)):
     """Load/preload the active model into memory"""
-    if not hasattr(request.app.state, "ollama_service") or not request.app.state.ollama_service:
-        raise HTTPException(status_code=503, detail="Ollama service not initialized")
-    
-    ollama_service = request.app.state.ollama_service
-    
     try:
         # Send a simple chat request to load the model
         # This will trigger Ollama to load the model into memory
@@ -3,47 +3,110 @@ Chat Completion Endpoints
 OpenAI-compatible chat API with file attachment support
 """
 
-from fastapi import APIRouter, HTTPException, Depends, UploadFile, File, Form
+from fastapi import APIRouter, HTTPException, Depends, UploadFile, File, Form, Request
 from fastapi.responses import StreamingResponse
-import json
+import orjson
 import time
 import logging
+import asyncio
+from concurrent.futures import Executor
 import base64
+import binascii
+import re
 from typing import Optional, List
 
 from app.schemas.requests import (
     ChatCompletionRequest,
     ChatCompletionResponse,
     ModelsResponse,
-    Message
+    Message,
+    FileAttachment
 )
+from app.core.config import settings
 from app.services.ollama import OllamaService
 from app.services.rag import RAGService
-from app.utils.helpers import log_request
+from app.utils.helpers import (
+    log_request,
+    coalesce_stream,
+    SSE_PREFIX,
+    SSE_SUFFIX,
+    SSE_DONE,
+    SSE_HEADERS
+)
 from app.utils.file_processor import FileProcessor
 
 router = APIRouter()
 logger = logging.getLogger(__name__)
 
+_BASE64_RE = re.compile(r'[A-Za-z0-9+/]+={0,2}')
+
+# MIME-style base64 wraps lines; any other whitespace means it is not base64
+_LINE_BREAKS = str.maketrans("", "", "\r\n")
 
-def get_ollama_service() -> OllamaService:
-    """Dependency injection for Ollama service"""
-    from app.main import ollama_service
+
+async def get_ollama_service(request: Request) -> OllamaService:
+    """Dependency injection for Ollama service, failing with 503 if not ready"""
+    ollama_service = getattr(request.app.state, "ollama_service", None)
+    if ollama_service is None:
+        raise HTTPException(status_code=503, detail="Ollama service not initialized")
     return ollama_service
 
 
-def get_rag_service() -> RAGService:
+async def get_rag_service(request: Request) -> Optional[RAGService]:
     """Dependency injection for RAG service"""
-    from app.main import rag_service
-    return rag_service
+    return getattr(request.app.state, "rag_service", None)
+
+
+def _maybe_b64decode(content: str) -> Optional[bytes]:
+    """Decode content if it is base64 (line wrapping allowed), otherwise return None"""
+    if "\n" in content or "\r" in content:
+        content = content.translate(_LINE_BREAKS)
+    if len(content) % 4 or not _BASE64_RE.fullmatch(content):
+        return None
+    try:
+        return base64.b64decode(content, validate=True)
+    except binascii.Error:
+        return None
+
+
+async def _process_attachment(
+    attachment: FileAttachment,
+    executor: Optional[Executor] = None
+) -> str:
+    """Extract the text of one attachment, formatted for the prompt"""
+    try:
+        # Decode base64 content if needed
+        if attachment.content.startswith('data:'):
+            # Format: data:mime/type;base64,content
+            comma = attachment.content.find(',')
+            if comma < 0:
+                raise ValueError("Malformed data URI")
+            file_bytes = base64.b64decode(attachment.content[comma + 1:])
+        else:
+            # Assume it's already decoded text or base64
+            file_bytes = _maybe_b64decode(attachment.content)
+            if file_bytes is None:
+                # Not base64, treat as plain text
+                return f"\n\n--- {attachment.filename} ---\n{attachment.content}"
+        
+        # Extract text from file
+        extraction_result = await FileProcessor.extract_text(
+            file_content=file_bytes,
+            filename=attachment.filename,
+            mime_type=attachment.mime_type,
+            executor=executor
+        )
+        
+        return f"\n\n--- Content from {attachment.filename} ---\n{extraction_result['text']}"
+    
+    except Exception as e:
+        logger.error("Error processing attachment %s: %s", attachment.filename, e)
+        return f"\n\n--- Error processing {attachment.filename}: {str(e)} ---"
 
 
 @router.get("/models", response_model=ModelsResponse)
 async def get_models(ollama: OllamaService = Depends(get_ollama_service)):
     """Get available models"""
-    if ollama is None:
-        raise HTTPException(status_code=503, detail="Ollama service not initialized")
-    
     model_info = await ollama.get_model_info()
     
     return {
@@ -52,9 +115,14 @@ async def get_models(ollama: OllamaService = Depends(get_ollama_service)):
     }
 
 
-@router.post("/chat/completions")
+@router.post(
+    "/chat/completions",
+    response_model=ChatCompletionResponse,
+    response_model_exclude_none=True
+)
 async def chat_completion(
     request: ChatCompletionRequest,
+    http_request: Request,
     ollama: OllamaService = Depends(get_ollama_service),
     rag: RAGService = Depends(get_rag_service)
 ):
@@ -65,61 +133,23 @@ async def chat_completion(
     """
     start_time = time.time()
     
-    if ollama is None:
-        raise HTTPException(status_code=503, detail="Ollama service not initialized")
-    
     try:
-        # Process messages and extract text from attachments
+        # Process messages and extract text from attachments, parsing
+        # PDF/DOCX in the extraction process pool like uploads
+        extraction_pool = getattr(http_request.app.state, "extraction_pool", None)
         processed_messages = []
         for msg in request.messages:
             content = msg.content
             
-            # Process attachments if present
+            # Process attachments concurrently if present
             if msg.attachments:
-                attachment_texts = []
-                for attachment in msg.attachments:
-                    try:
-                        # Decode base64 content if needed
-                        if attachment.content.startswith('data:'):
-                            # Format: data:mime/type;base64,content
-                            base64_content = attachment.content.split(',')[1]
-                            file_bytes = base64.b64decode(base64_content)
-                        else:
-                            # Assume it's already decoded text or base64
-                            try:
-                                file_bytes = base64.b64decode(attachment.content)
-                            except:
-                                # If decode fails, treat as plain text
-                                attachment_texts.append(f"\n\n--- {attachment.filename} ---\n{attachment.content}")
-                                continue
-                        
-                        # Extract text from file
-                        extraction_result = await FileProcessor.extract_text(
-                            file_content=file_bytes,
-                            filename=attachment.filename,
-                            mime_type=attachment.mime_type
-                        )
-                        
-                        attachment_texts.append(
-                            f"\n\n--- Content from {attachment.filename} ---\n{extraction_result['text']}"
-                        )
-                    
-                    except Exception as e:
-                        logger.error(f"Error processing attachment {attachment.filename}: {e}")
-                        attachment_texts.append(
-                            f"\n\n--- Error processing {attachment.filename}: {str(e)} ---"
-                        )
-                
-                # Append attachment texts to message content
-                if attachment_texts:
-                    content = content + ''.join(attachment_texts)
+                attachment_texts = await asyncio.gather(
+                    *(_process_attachment(attachment, extraction_pool) for attachment in msg.attachments)
+                )
+                content = content + ''.join(attachment_texts)
             
             processed_messages.append({"role": msg.role, "content": content})
         
-        # Estimate input tokens
-        prompt_text = " ".join([msg["content"] for msg in processed_messages])
-        input_tokens = ollama.count_tokens(prompt_text)
-        
         if request.stream:
             # Streaming response
             async def generate():
@@ -133,41 +163,47 @@ async def chat_completion(
                         stream=True
                     )
                     
-                    async for text in streamer:
-                        chunk = {
-                            "id": f"chatcmpl-{int(time.time())}",
-                            "object": "chat.completion.chunk",
-                            "created": int(time.time()),
-                            "model": "terraform-codellama",
-                            "choices": [{
-                                "index": 0,
-                                "delta": {"content": text},
-                                "finish_reason": None
-                            }]
-                        }
-                        yield f"data: {json.dumps(chunk)}\n\n"
+                    chunks = coalesce_stream(
+                        streamer,
+                        max_chars=settings.inference.stream_flush_chars,
+                        max_delay=settings.inference.stream_max_delay_ms / 1000
+                    )
                     
-                    # Send final chunk
-                    final_chunk = {
-                        "id": f"chatcmpl-{int(time.time())}",
+                    # Per-response fields are fixed; only the delta changes per chunk
+                    created = int(time.time())
+                    choice = {"index": 0, "delta": {"content": ""}, "finish_reason": None}
+                    chunk = {
+                        "id": f"chatcmpl-{created}",
                         "object": "chat.completion.chunk",
-                        "created": int(time.time()),
+                        "created": created,
                         "model": "terraform-codellama",
-                        "choices": [{
-                            "index": 0,
-                            "delta": {},
-                            "finish_reason": "stop"
-                        }]
+                        "choices": [choice]
                     }
-                    yield f"data: {json.dumps(final_chunk)}\n\n"
-                    yield "data: [DONE]\n\n"
+                    
+                    # Bind hot-loop names to locals
+                    dumps = orjson.dumps
+                    prefix, suffix = SSE_PREFIX, SSE_SUFFIX
+                    delta = choice["delta"]
+                    async for text in chunks:
+                        delta["content"] = text
+                        yield prefix + dumps(chunk) + suffix
+                    
+                    # Send final chunk
+                    choice["delta"] = {}
+                    choice["finish_reason"] = "stop"
+                    yield SSE_PREFIX + orjson.dumps(chunk) + SSE_SUFFIX
+                    yield SSE_DONE
                     
                 except Exception as e:
-                    logger.error(f"Streaming error: {e}")
+                    logger.error("Streaming error: %s", e)
                     error_chunk = {"error": str(e)}
-                    yield f"data: {json.dumps(error_chunk)}\n\n"
+                    yield SSE_PREFIX + orjson.dumps(error_chunk) + SSE_SUFFIX
             
-            return StreamingResponse(generate(), media_type="text/event-stream")
+            return StreamingResponse(
+                generate(),
+                media_type="text/event-stream",
+                headers=SSE_HEADERS
+            )
         
         else:
             # Non-streaming response
@@ -182,7 +218,10 @@ async def chat_completion(
             
             generated_text = result['content']
             output_tokens = result.get('eval_count', ollama.count_tokens(generated_text))
-            prompt_tokens = result.get('prompt_eval_count', input_tokens)
+            prompt_tokens = result.get('prompt_eval_count')
+            if prompt_tokens is None:
+                # Estimate input tokens
+                prompt_tokens = ollama.count_tokens_iter(msg["content"] for msg in processed_messages)
             inference_time = time.time() - start_time
             
             # Log request
@@ -193,10 +232,11 @@ async def chat_completion(
                 inference_time=inference_time
             )
             
+            created = int(time.time())
             return {
-                "id": f"chatcmpl-{int(time.time())}",
+                "id": f"chatcmpl-{created}",
                 "object": "chat.completion",
-                "created": int(time.time()),
+                "created": created,
                 "model": "terraform-codellama",
                 "choices": [{
                     "index": 0,
@@ -216,5 +256,5 @@ async def chat_completion(
     except ValueError as e:
         raise HTTPException(status_code=400, detail=str(e))
     except Exception as e:
-        logger.error(f"Chat completion error: {e}")
+        logger.error("Chat completion error: %s", e)
         raise HTTPException(status_code=500, detail=str(e))
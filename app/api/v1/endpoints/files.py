@@ -3,28 +3,37 @@ File Upload Endpoints
 Handle file uploads and storage in RAG
 """
 
-from fastapi import APIRouter, HTTPException, UploadFile, File, Form, Depends
+from fastapi import APIRouter, HTTPException, UploadFile, File, Form, Depends, Request
 from typing import Optional, List
+import asyncio
 import logging
 import uuid
-from datetime import datetime
+import orjson
+from datetime import datetime, timezone
 
+from app.core.config import settings
 from app.schemas.requests import FileUploadResponse, FileListResponse
-from app.services.rag import RAGService
-from app.utils.file_processor import FileProcessor
+from app.services.rag import RAGService, UPLOAD_SOURCE
+from app.utils.file_processor import FileProcessor, SUPPORTED_EXTENSIONS_STR
 
 router = APIRouter()
 logger = logging.getLogger(__name__)
 
+UPLOAD_READ_CHUNK_SIZE = 1 << 20  # 1MB
 
-def get_rag_service() -> RAGService:
+# Written after any client metadata so the upload marker cannot be
+# overridden or forged through the metadata form field
+UPLOADED_FILES_FILTER = {"source": UPLOAD_SOURCE}
+
+
+async def get_rag_service(request: Request) -> Optional[RAGService]:
     """Dependency injection for RAG service"""
-    from app.main import rag_service
-    return rag_service
+    return getattr(request.app.state, "rag_service", None)
 
 
 @router.post("/upload", response_model=FileUploadResponse)
 async def upload_file(
+    request: Request,
     file: UploadFile = File(...),
     store_in_rag: bool = Form(True),
     metadata: Optional[str] = Form(None),
@@ -45,52 +54,65 @@ async def upload_file(
         if not FileProcessor.is_supported(file.filename):
             raise HTTPException(
                 status_code=400,
-                detail=f"Unsupported file type. Supported: {', '.join(FileProcessor.SUPPORTED_EXTENSIONS.keys())}"
+                detail=f"Unsupported file type. Supported: {SUPPORTED_EXTENSIONS_STR}"
             )
         
-        # Read file content
-        file_content = await file.read()
-        file_size = len(file_content)
+        custom_metadata = {}
+        if metadata:
+            try:
+                custom_metadata = orjson.loads(metadata)
+            except orjson.JSONDecodeError:
+                logger.warning("Invalid metadata JSON: %s", metadata)
+            if not isinstance(custom_metadata, dict):
+                raise HTTPException(status_code=400, detail="Metadata must be a JSON object")
+            # Other server keys simply overwrite client values below
+            if "source" in custom_metadata:
+                raise HTTPException(status_code=400, detail="Metadata key 'source' is set by the server")
         
-        # Validate file size (10MB default limit)
-        if not FileProcessor.validate_file_size(file_size, max_size_mb=10):
-            raise HTTPException(
-                status_code=400,
-                detail="File size exceeds 10MB limit"
-            )
+        # Starlette has already spooled the body; RequestSizeLimitMiddleware
+        # rejects oversized uploads up front. This loop only caps the
+        # in-memory copy when no Content-Length was sent.
+        max_size = settings.security.max_request_size
+        file_content = bytearray()
+        while chunk := await file.read(UPLOAD_READ_CHUNK_SIZE):
+            file_content.extend(chunk)
+            if len(file_content) > max_size:
+                raise HTTPException(
+                    status_code=413,
+                    detail=f"File size exceeds {max_size // (1024 * 1024)}MB limit"
+                )
+        file_size = len(file_content)
         
-        # Extract text from file
+        # Extract text from file; the buffer is passed as-is, not copied to bytes
         extraction_result = await FileProcessor.extract_text(
             file_content=file_content,
-            filename=file.filename
+            filename=file.filename,
+            executor=getattr(request.app.state, "extraction_pool", None)
         )
         
-        doc_id = str(uuid.uuid4())
+        doc_id = uuid.uuid4().hex
         extracted_text = extraction_result['text']
         
         # Prepare metadata
-        import json
-        file_metadata = extraction_result['metadata']
-        file_metadata['uploaded_at'] = datetime.utcnow().isoformat()
+        file_metadata = custom_metadata
+        file_metadata.update(extraction_result['metadata'])
+        file_metadata['filename'] = file.filename
+        file_metadata['size'] = file_size
+        file_metadata['uploaded_at'] = datetime.now(timezone.utc).isoformat(timespec='seconds')
         file_metadata['doc_id'] = doc_id
         file_metadata['format'] = extraction_result['format']
-        
-        if metadata:
-            try:
-                custom_metadata = json.loads(metadata)
-                file_metadata.update(custom_metadata)
-            except json.JSONDecodeError:
-                logger.warning(f"Invalid metadata JSON: {metadata}")
+        file_metadata['source'] = UPLOAD_SOURCE
         
         # Store in RAG if requested
         if store_in_rag:
-            stored_id = rag.add_document(
+            stored_id = await asyncio.to_thread(
+                rag.add_document,
                 text=extracted_text,
                 doc_id=doc_id,
                 metadata=file_metadata
             )
             
-            logger.info(f"File {file.filename} stored in RAG with ID: {stored_id}")
+            logger.info("File %s stored in RAG with ID: %s", file.filename, stored_id)
             
             return {
                 "id": stored_id,
@@ -112,10 +134,12 @@ async def upload_file(
                 "metadata": file_metadata
             }
     
+    except HTTPException:
+        raise
     except ValueError as e:
         raise HTTPException(status_code=400, detail=str(e))
     except Exception as e:
-        logger.error(f"File upload error: {e}")
+        logger.error("File upload error: %s", e)
         raise HTTPException(status_code=500, detail=f"Failed to process file: {str(e)}")
 
 
@@ -135,10 +159,15 @@ async def list_files(
         raise HTTPException(status_code=503, detail="RAG service not initialized")
     
     try:
-        documents = rag.list_documents(limit=limit, offset=offset)
-        stats = rag.get_stats()
+        documents = await asyncio.to_thread(
+            rag.list_documents,
+            limit=limit,
+            offset=offset,
+            where=UPLOADED_FILES_FILTER,
+            include_text=False
+        )
+        total = await asyncio.to_thread(rag.count_documents, where=UPLOADED_FILES_FILTER)
         
-        # Filter to only show uploaded files (those with filename in metadata)
         files = [
             {
                 "id": doc["id"],
@@ -148,16 +177,15 @@ async def list_files(
                 "size": doc["metadata"].get("size", 0)
             }
             for doc in documents
-            if "filename" in doc["metadata"]
         ]
         
         return {
             "files": files,
-            "total": stats["total_documents"]
+            "total": total
         }
     
     except Exception as e:
-        logger.error(f"Error listing files: {e}")
+        logger.error("Error listing files: %s", e)
         raise HTTPException(status_code=500, detail=str(e))
 
 
@@ -175,7 +203,7 @@ async def delete_file(
         raise HTTPException(status_code=503, detail="RAG service not initialized")
     
     try:
-        success = rag.delete_document(file_id)
+        success = await asyncio.to_thread(rag.delete_document, file_id)
         
         if success:
             return {
@@ -186,7 +214,7 @@ async def delete_file(
             raise HTTPException(status_code=404, detail=f"File {file_id} not found")
     
     except Exception as e:
-        logger.error(f"Error deleting file: {e}")
+        logger.error("Error deleting file: %s", e)
         raise HTTPException(status_code=500, detail=str(e))
 
 
@@ -204,7 +232,7 @@ async def get_file(
         raise HTTPException(status_code=503, detail="RAG service not initialized")
     
     try:
-        document = rag.get_document(file_id)
+        document = await asyncio.to_thread(rag.get_document, file_id)
         
         if document:
             return {
@@ -217,5 +245,5 @@ async def get_file(
             raise HTTPException(status_code=404, detail=f"File {file_id} not found")
     
     except Exception as e:
-        logger.error(f"Error retrieving file: {e}")
+        logger.error("Error retrieving file: %s", e)
         raise HTTPException(status_code=500, detail=str(e))
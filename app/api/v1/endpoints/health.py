@@ -3,24 +3,36 @@ Health Check Endpoint
 System health and status monitoring
 """
 
-from fastapi import APIRouter, Depends
+from fastapi import APIRouter, Depends, Request
+from typing import Optional
+from cachetools import TTLCache
 from app.schemas.requests import HealthResponse
 from app.services.ollama import OllamaService
 from app.services.rag import RAGService
 
 router = APIRouter()
 
+# Recent Ollama probe result, shared across health checks
+_probe_cache: TTLCache = TTLCache(maxsize=1, ttl=2)
 
-def get_ollama_service() -> OllamaService:
+
+async def get_ollama_service(request: Request) -> Optional[OllamaService]:
     """Dependency injection for Ollama service"""
-    from app.main import ollama_service
-    return ollama_service
+    return getattr(request.app.state, "ollama_service", None)
 
 
-def get_rag_service() -> RAGService:
+async def get_rag_service(request: Request) -> Optional[RAGService]:
     """Dependency injection for RAG service"""
-    from app.main import rag_service
-    return rag_service
+    return getattr(request.app.state, "rag_service", None)
+
+
+async def cached_probe(ollama: OllamaService) -> bool:
+    """Probe Ollama, reusing a result from the last couple of seconds"""
+    healthy = _probe_cache.get("ollama")
+    if healthy is None:
+        healthy = await ollama.health_check()
+        _probe_cache["ollama"] = healthy
+    return healthy
 
 
 @router.get("/health", response_model=HealthResponse)
@@ -29,7 +41,7 @@ async def health_check(
     rag: RAGService = Depends(get_rag_service)
 ):
     """Health check endpoint"""
-    ollama_healthy = await ollama.health_check() if ollama else False
+    ollama_healthy = await cached_probe(ollama) if ollama else False
     
     return {
         "status": "healthy" if ollama_healthy else "degraded",
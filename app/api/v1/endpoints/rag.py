@@ -3,11 +3,13 @@ RAG Endpoints
 Document management and RAG-enhanced chat
 """
 
-from fastapi import APIRouter, HTTPException, Depends
+from fastapi import APIRouter, HTTPException, Depends, Request
 from fastapi.responses import StreamingResponse
-import json
+import orjson
 import time
+import asyncio
 import logging
+from typing import Optional
 
 from app.schemas.requests import (
     RAGDocumentRequest,
@@ -19,22 +21,31 @@ from app.schemas.requests import (
 )
 from app.services.ollama import OllamaService
 from app.services.rag import RAGService
-from app.utils.helpers import sanitize_input, log_request
+from app.core.config import settings
+from app.utils.helpers import (
+    sanitize_input,
+    log_request,
+    coalesce_stream,
+    SSE_PREFIX,
+    SSE_SUFFIX,
+    SSE_DONE,
+    SSE_HEADERS
+)
 
 router = APIRouter()
 logger = logging.getLogger(__name__)
 
+_RAG_SYSTEM_PROMPT = "Use the following context to answer the user's question:\n\n{context}"
+
 
-def get_ollama_service() -> OllamaService:
+async def get_ollama_service(request: Request) -> Optional[OllamaService]:
     """Dependency injection for Ollama service"""
-    from app.main import ollama_service
-    return ollama_service
+    return getattr(request.app.state, "ollama_service", None)
 
 
-def get_rag_service() -> RAGService:
+async def get_rag_service(request: Request) -> Optional[RAGService]:
     """Dependency injection for RAG service"""
-    from app.main import rag_service
-    return rag_service
+    return getattr(request.app.state, "rag_service", None)
 
 
 @router.post("/documents")
@@ -47,7 +58,8 @@ async def add_document(
         raise HTTPException(status_code=503, detail="RAG service not initialized")
     
     try:
-        doc_id = rag.add_document(
+        doc_id = await asyncio.to_thread(
+            rag.add_document,
             text=sanitize_input(request.text),
             doc_id=request.id,
             metadata=request.metadata
@@ -56,7 +68,7 @@ async def add_document(
         return {"id": doc_id, "status": "added"}
     
     except Exception as e:
-        logger.error(f"Error adding document: {e}")
+        logger.error("Error adding document: %s", e)
         raise HTTPException(status_code=500, detail=str(e))
 
 
@@ -69,7 +81,7 @@ async def get_document(
     if rag is None:
         raise HTTPException(status_code=503, detail="RAG service not initialized")
     
-    document = rag.get_document(doc_id)
+    document = await asyncio.to_thread(rag.get_document, doc_id)
     
     if document is None:
         raise HTTPException(status_code=404, detail="Document not found")
@@ -87,7 +99,8 @@ async def update_document(
     if rag is None:
         raise HTTPException(status_code=503, detail="RAG service not initialized")
     
-    success = rag.update_document(
+    success = await asyncio.to_thread(
+        rag.update_document,
         doc_id=doc_id,
         text=sanitize_input(request.text),
         metadata=request.metadata
@@ -108,7 +121,7 @@ async def delete_document(
     if rag is None:
         raise HTTPException(status_code=503, detail="RAG service not initialized")
     
-    success = rag.delete_document(doc_id)
+    success = await asyncio.to_thread(rag.delete_document, doc_id)
     
     if not success:
         raise HTTPException(status_code=404, detail="Document not found")
@@ -126,7 +139,7 @@ async def list_documents(
     if rag is None:
         raise HTTPException(status_code=503, detail="RAG service not initialized")
     
-    documents = rag.list_documents(limit=limit, offset=offset)
+    documents = await asyncio.to_thread(rag.list_documents, limit=limit, offset=offset)
     
     return {
         "documents": documents,
@@ -145,7 +158,8 @@ async def rag_query(
         raise HTTPException(status_code=503, detail="RAG service not initialized")
     
     try:
-        results = rag.query(
+        results = await asyncio.to_thread(
+            rag.query,
             query_text=sanitize_input(request.query),
             top_k=request.top_k
         )
@@ -153,7 +167,7 @@ async def rag_query(
         return {"results": results}
     
     except Exception as e:
-        logger.error(f"RAG query error: {e}")
+        logger.error("RAG query error: %s", e)
         raise HTTPException(status_code=500, detail=str(e))
 
 
@@ -170,10 +184,43 @@ async def rag_chat(
     start_time = time.time()
     
     try:
+        query = sanitize_input(request.query)
+        query_embedding = None
+        # Captured before retrieval so a concurrent document change
+        # keeps the stale answer out of the response cache
+        cache_generation = rag.cache_generation
+        
+        # Serve repeated and near-duplicate questions from the response cache.
+        # Only greedy (temperature 0) completions are cached; replaying a
+        # sampled answer would freeze it for every later request.
+        temperature = request.temperature
+        if temperature is None:
+            temperature = settings.inference.default_temperature
+        use_cache = rag.cache_enabled and not request.stream and temperature == 0
+        if use_cache:
+            cache_params = (request.top_k, ollama.model_name, request.max_tokens)
+            cached = rag.response_cache.get(query, cache_params)
+            if cached is None:
+                query_embedding = await asyncio.to_thread(rag.embed_query, query)
+                # The similarity scan is linear in the cache size; keep it off the event loop
+                cached = await asyncio.to_thread(
+                    rag.response_cache.get_similar, query_embedding, cache_params
+                )
+            if cached is not None:
+                created = int(time.time())
+                return {
+                    "id": f"rag-{created}",
+                    "object": "rag.chat.completion",
+                    "created": created,
+                    **cached
+                }
+        
         # Build context from retrieved documents
-        context = rag.build_rag_context(
-            query=sanitize_input(request.query),
-            top_k=request.top_k
+        context = await asyncio.to_thread(
+            rag.build_rag_context,
+            query=query,
+            top_k=request.top_k,
+            query_embedding=query_embedding
         )
         
         # Build messages with context
@@ -181,44 +228,69 @@ async def rag_chat(
         if context:
             messages.append({
                 "role": "system",
-                "content": f"Use the following context to answer the user's question:\n\n{context}"
+                "content": _RAG_SYSTEM_PROMPT.format(context=context)
             })
         messages.append({
             "role": "user",
             "content": request.query
         })
         
-        # Estimate input tokens
-        full_text = context + " " + request.query
-        input_tokens = ollama.count_tokens(full_text)
-        
         if request.stream:
             # Streaming response
             async def generate():
                 try:
+                    usage = {}
                     streamer = await ollama.chat(
                         messages=messages,
                         max_tokens=request.max_tokens,
                         temperature=request.temperature,
-                        stream=True
+                        stream=True,
+                        usage=usage
                     )
                     
-                    async for text in streamer:
-                        chunk = {
-                            "id": f"rag-{int(time.time())}",
-                            "object": "rag.chat.chunk",
-                            "created": int(time.time()),
-                            "delta": {"content": text}
-                        }
-                        yield f"data: {json.dumps(chunk)}\n\n"
+                    chunks = coalesce_stream(
+                        streamer,
+                        max_chars=settings.inference.stream_flush_chars,
+                        max_delay=settings.inference.stream_max_delay_ms / 1000
+                    )
+                    
+                    # Per-response fields are fixed; only the delta changes per chunk
+                    created = int(time.time())
+                    delta = {"content": ""}
+                    chunk = {
+                        "id": f"rag-{created}",
+                        "object": "rag.chat.chunk",
+                        "created": created,
+                        "delta": delta
+                    }
+                    
+                    dumps = orjson.dumps
+                    async for text in chunks:
+                        delta["content"] = text
+                        yield SSE_PREFIX + dumps(chunk) + SSE_SUFFIX
                     
-                    yield "data: [DONE]\n\n"
+                    yield SSE_DONE
+                    
+                    # Token counts come from Ollama's final stream message
+                    prompt_tokens = usage.get('prompt_eval_count')
+                    if prompt_tokens is None:
+                        prompt_tokens = ollama.count_tokens_iter((context, request.query))
+                    log_request(
+                        endpoint="/v1/rag/chat",
+                        input_tokens=prompt_tokens,
+                        output_tokens=usage.get('eval_count') or 0,
+                        inference_time=time.time() - start_time
+                    )
                     
                 except Exception as e:
-                    logger.error(f"RAG streaming error: {e}")
-                    yield f"data: {{\"error\": \"{str(e)}\"}}\n\n"
+                    logger.error("RAG streaming error: %s", e)
+                    yield SSE_PREFIX + orjson.dumps({"error": str(e)}) + SSE_SUFFIX
             
-            return StreamingResponse(generate(), media_type="text/event-stream")
+            return StreamingResponse(
+                generate(),
+                media_type="text/event-stream",
+                headers=SSE_HEADERS
+            )
         
         else:
             # Non-streaming response
@@ -231,7 +303,10 @@ async def rag_chat(
             
             generated_text = result['content']
             output_tokens = result.get('eval_count', ollama.count_tokens(generated_text))
-            prompt_tokens = result.get('prompt_eval_count', input_tokens)
+            prompt_tokens = result.get('prompt_eval_count')
+            if prompt_tokens is None:
+                # Estimate input tokens
+                prompt_tokens = ollama.count_tokens_iter((context, request.query))
             inference_time = time.time() - start_time
             
             # Log request
@@ -242,10 +317,7 @@ async def rag_chat(
                 inference_time=inference_time
             )
             
-            return {
-                "id": f"rag-{int(time.time())}",
-                "object": "rag.chat.completion",
-                "created": int(time.time()),
+            completion = {
                 "response": generated_text,
                 "usage": {
                     "prompt_tokens": prompt_tokens,
@@ -253,11 +325,21 @@ async def rag_chat(
                     "total_tokens": prompt_tokens + output_tokens
                 }
             }
+            if use_cache and cache_generation == rag.cache_generation:
+                rag.response_cache.set(query, completion, cache_params, query_embedding)
+            
+            created = int(time.time())
+            return {
+                "id": f"rag-{created}",
+                "object": "rag.chat.completion",
+                "created": created,
+                **completion
+            }
     
     except ValueError as e:
         raise HTTPException(status_code=400, detail=str(e))
     except Exception as e:
-        logger.error(f"RAG chat error: {e}")
+        logger.error("RAG chat error: %s", e)
         raise HTTPException(status_code=500, detail=str(e))
 
 
@@ -267,4 +349,4 @@ async def get_rag_stats(rag: RAGService = Depends(get_rag_service)):
     if rag is None:
         raise HTTPException(status_code=503, detail="RAG service not initialized")
     
-    return rag.get_stats()
+    return await asyncio.to_thread(rag.get_stats)
@@ -3,20 +3,98 @@ Application Configuration
 Centralized settings management using Pydantic
 """
 
-from pydantic_settings import BaseSettings
-from pydantic import Field
-from typing import List, Optional
+from pydantic_settings import BaseSettings, SettingsConfigDict
+from pydantic import Field, model_validator
+from typing import Any, Dict, List, Optional, Tuple
 from pathlib import Path
+import copy
+import os
+import shutil
+import tempfile
 import yaml
 
+# Prefer the libyaml C implementation when available
+try:
+    from yaml import CSafeLoader as SafeLoader, CSafeDumper as SafeDumper
+except ImportError:
+    from yaml import SafeLoader, SafeDumper
+
+CONFIG_PATH = "config/server_config.yaml"
+
+# Parsed config files keyed by path, tagged with (mtime_ns, size)
+_config_cache: Dict[str, Tuple[Tuple[int, int], Dict[str, Any]]] = {}
+
+
+def _file_signature(config_path: str) -> Tuple[int, int]:
+    """Get a cheap change marker for a file"""
+    stat = os.stat(config_path)
+    return stat.st_mtime_ns, stat.st_size
+
+
+def load_config_file(config_path: str = CONFIG_PATH) -> Dict[str, Any]:
+    """
+    Load a YAML config file
+    
+    The parsed result is reused until the file's mtime or size changes.
+    
+    Args:
+        config_path: Path to the YAML file
+        
+    Returns:
+        A copy of the parsed config, safe for the caller to modify
+    """
+    signature = _file_signature(config_path)
+    cached = _config_cache.get(config_path)
+    
+    if cached is None or cached[0] != signature:
+        with open(config_path, 'rb') as f:
+            config_data = yaml.load(f, Loader=SafeLoader) or {}
+        cached = (signature, config_data)
+        _config_cache[config_path] = cached
+    
+    return copy.deepcopy(cached[1])
+
+
+def save_config_file(config_data: Dict[str, Any], config_path: str = CONFIG_PATH) -> None:
+    """
+    Atomically write a YAML config file and refresh the parse cache
+    
+    The data is written to a temporary file in the same directory and
+    moved over the original, so readers never see a partial file.
+    
+    Args:
+        config_data: Config dictionary to write
+        config_path: Path to the YAML file
+    """
+    config_dir = os.path.dirname(os.path.abspath(config_path))
+    fd, tmp_path = tempfile.mkstemp(dir=config_dir, prefix='.', suffix='.tmp')
+    
+    try:
+        with os.fdopen(fd, 'w') as f:
+            yaml.dump(config_data, f, Dumper=SafeDumper, default_flow_style=False)
+        if os.path.exists(config_path):
+            shutil.copymode(config_path, tmp_path)
+        os.replace(tmp_path, config_path)
+    except BaseException:
+        try:
+            os.unlink(tmp_path)
+        except OSError:
+            pass
+        raise
+    
+    _config_cache[config_path] = (_file_signature(config_path), copy.deepcopy(config_data))
+
 
 class ServerSettings(BaseSettings):
     """Server configuration"""
     host: str = "0.0.0.0"
     port: int = 8000
     workers: int = 1
+    extraction_workers: int = 0  # 0 = one process per CPU
     reload: bool = False
     log_level: str = "info"
+    loop: str = "auto"  # uvicorn event loop: auto (uvloop if installed), uvloop or asyncio
+    http: str = "auto"  # uvicorn HTTP parser: auto (httptools if installed), httptools or h11
 
 
 class ModelSettings(BaseSettings):
@@ -25,6 +103,9 @@ class ModelSettings(BaseSettings):
     model_name: str = "terraform-codellama"
     timeout: int = 300
     keep_alive: str = "5m"
+    max_connections: int = 100
+    # Streams hold a connection for the whole generation; keep them all warm
+    max_keepalive_connections: int = 100
 
 
 class InferenceSettings(BaseSettings):
@@ -34,17 +115,41 @@ class InferenceSettings(BaseSettings):
     default_top_p: float = 0.9
     default_top_k: int = 50
     max_prompt_length: int = 4096
-    stream_chunk_size: int = 1
+    stream_flush_chars: int = 64  # buffered characters per SSE frame; 1 disables coalescing
+    stream_max_delay_ms: int = 20
+    
+    @model_validator(mode="before")
+    @classmethod
+    def _drop_stream_chunk_size(cls, data: Any) -> Any:
+        """Ignore the retired token-count stream_chunk_size key in older config files"""
+        if isinstance(data, dict) and "stream_chunk_size" in data:
+            data = {k: v for k, v in data.items() if k != "stream_chunk_size"}
+        return data
 
 
 class RAGSettings(BaseSettings):
     """RAG configuration"""
     chroma_persist_directory: str = "./chroma"
     embedding_model: str = "sentence-transformers/all-MiniLM-L6-v2"
+    embedding_backend: str = "torch"  # torch, onnx or openvino
+    embedding_precision: str = "fp32"  # fp32 or int8 (onnx/openvino only)
+    embedding_device: str = ""  # e.g. cpu, cuda, mps; empty = auto-detect
+    embedding_batch_size: int = 64
     default_top_k: int = 3
     chunk_size: int = 512
     chunk_overlap: int = 50
     collection_name: str = "documents"
+    # HNSW index parameters, applied when the collection is first created
+    hnsw_space: str = "cosine"
+    hnsw_construction_ef: int = 200
+    hnsw_m: int = 32
+    hnsw_search_ef: int = 64
+    embedding_cache_enabled: bool = True
+    embedding_cache_max_entries: int = 100000  # 0 = unbounded
+    semantic_cache_enabled: bool = True
+    semantic_cache_size: int = 1024  # also the number of rows each similarity lookup scores
+    semantic_cache_ttl: int = 300
+    semantic_cache_threshold: float = 0.95
 
 
 class SecuritySettings(BaseSettings):
@@ -78,22 +183,22 @@ class Settings(BaseSettings):
     security: SecuritySettings = SecuritySettings()
     logging: LoggingSettings = LoggingSettings()
     
-    class Config:
-        env_file = ".env"
-        env_file_encoding = "utf-8"
-        case_sensitive = False
+    model_config = SettingsConfigDict(
+        env_file=".env",
+        env_file_encoding="utf-8",
+        case_sensitive=False
+    )
     
     @classmethod
-    def from_yaml(cls, config_path: str = "config/server_config.yaml") -> "Settings":
-        """Load settings from YAML file"""
+    def from_yaml(cls, config_path: str = CONFIG_PATH) -> "Settings":
+        """Load settings from YAML file (parsed with the C loader and cached by mtime)"""
         config_file = Path(config_path)
         
         if not config_file.exists():
             # Return default settings if config file doesn't exist
             return cls()
         
-        with open(config_file, 'r') as f:
-            config_data = yaml.safe_load(f)
+        config_data = load_config_file(config_path) or {}
         
         return cls(
             server=ServerSettings(**config_data.get('server', {})),
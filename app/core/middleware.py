@@ -0,0 +1,33 @@
+"""
+ASGI Middleware
+Request guards applied before routing
+"""
+
+from typing import Iterable
+
+from starlette.responses import JSONResponse
+from starlette.types import ASGIApp, Receive, Scope, Send
+
+
+class RequestSizeLimitMiddleware:
+    """Reject requests to the given paths whose declared Content-Length exceeds a limit with 413"""
+
+    def __init__(self, app: ASGIApp, max_request_size: int, paths: Iterable[str]):
+        self.app = app
+        self.max_request_size = max_request_size
+        self.paths = frozenset(paths)
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send) -> None:
+        if scope["type"] == "http" and scope["path"] in self.paths:
+            for name, value in scope["headers"]:
+                if name == b"content-length":
+                    if value.isdigit() and int(value) > self.max_request_size:
+                        response = JSONResponse(
+                            status_code=413,
+                            content={"detail": "Request body too large"}
+                        )
+                        await response(scope, receive, send)
+                        return
+                    break
+
+        await self.app(scope, receive, send)
@@ -6,15 +6,22 @@ Main FastAPI application entry point
 from fastapi import FastAPI
 from fastapi.middleware.cors import CORSMiddleware
 from contextlib import asynccontextmanager
+import asyncio
+from concurrent.futures import ProcessPoolExecutor
 import logging
+import multiprocessing
 from typing import Optional
 
 from app.core.config import settings
 from app.core.logging import setup_logging
+from app.core.middleware import RequestSizeLimitMiddleware
 from app.services.ollama import OllamaService
 from app.services.rag import RAGService
 from app.api.v1.router import api_router
 
+# Allowance for multipart framing and small form fields on top of the file size
+MULTIPART_OVERHEAD = 64 * 1024
+
 # Initialize logging
 setup_logging()
 logger = logging.getLogger(__name__)
@@ -24,6 +31,14 @@ ollama_service: Optional[OllamaService] = None
 rag_service: Optional[RAGService] = None
 
 
+async def probe_ollama(service: OllamaService) -> None:
+    """Check Ollama in the background and log whether it is reachable"""
+    if await service.health_check():
+        logger.info("Ollama service is running")
+    else:
+        logger.warning("Ollama service may not be running. Start it with: ollama serve")
+
+
 @asynccontextmanager
 async def lifespan(app: FastAPI):
     """Lifespan context manager for startup and shutdown events"""
@@ -37,33 +52,48 @@ async def lifespan(app: FastAPI):
         logger.info("Initializing Ollama service...")
         ollama_service = OllamaService()
         
-        # Health check
-        is_healthy = await ollama_service.health_check()
-        if not is_healthy:
-            logger.warning("Ollama service may not be running. Start it with: ollama serve")
-        else:
-            logger.info("Ollama service is running")
+        # Health check runs in the background so startup never waits on Ollama
+        app.state.ollama_probe_task = asyncio.create_task(probe_ollama(ollama_service))
         
-        # Initialize RAG service
+        # Initialize RAG service (loads the embedding model) off the event loop
         logger.info("Initializing RAG service...")
-        rag_service = RAGService()
+        rag_service = await asyncio.to_thread(RAGService)
+        
+        # One-time migration: uploads stored before the source marker existed
+        tagged = await asyncio.to_thread(rag_service.backfill_upload_source)
+        if tagged:
+            logger.info("Tagged %s previously uploaded files", tagged)
         
         # Attach to app state for access in endpoints
         app.state.ollama_service = ollama_service
         app.state.rag_service = rag_service
         
+        # Process pool for CPU-bound file extraction (PDF/DOCX parsing)
+        app.state.extraction_pool = ProcessPoolExecutor(
+            max_workers=settings.server.extraction_workers or None,
+            mp_context=multiprocessing.get_context("spawn")
+        )
+        
         logger.info("Server initialization completed successfully")
         
     except Exception as e:
-        logger.error(f"Failed to initialize server: {e}")
+        logger.error("Failed to initialize server: %s", e)
         raise
     
     yield
     
     # Shutdown
     logger.info("Shutting down server...")
+    probe_task = getattr(app.state, "ollama_probe_task", None)
+    if probe_task:
+        probe_task.cancel()
     if ollama_service:
         await ollama_service.close()
+    if rag_service:
+        await asyncio.to_thread(rag_service.close)
+    extraction_pool = getattr(app.state, "extraction_pool", None)
+    if extraction_pool:
+        extraction_pool.shutdown(wait=False, cancel_futures=True)
 
 
 # Create FastAPI app
@@ -86,6 +116,16 @@ app.add_middleware(
 # Include API router
 app.include_router(api_router)
 
+# Reject oversized uploads before the body is read; other endpoints are
+# not limited. max_request_size is the per-file limit, checked exactly by
+# the upload handler, so the whole multipart body gets headroom for
+# boundaries, part headers and the other form fields.
+app.add_middleware(
+    RequestSizeLimitMiddleware,
+    max_request_size=settings.security.max_request_size + MULTIPART_OVERHEAD,
+    paths=[app.url_path_for("upload_file")]
+)
+
 
 
 @app.get("/")
@@ -106,5 +146,8 @@ if __name__ == "__main__":
         host=settings.server.host,
         port=settings.server.port,
         reload=settings.server.reload,
-        log_level=settings.server.log_level
+        log_level=settings.server.log_level,
+        loop=settings.server.loop,
+        http=settings.server.http,
+        interface="asgi3"
     )
@@ -4,10 +4,12 @@ Pydantic models for API validation
 """
 
 from pydantic import BaseModel, Field
+from pydantic.dataclasses import dataclass
 from typing import List, Optional, Dict, Any, Literal
 
 
-class FileAttachment(BaseModel):
+@dataclass(slots=True)
+class FileAttachment:
     """File attachment metadata"""
     filename: str
     content: str  # Base64 encoded file content or extracted text
@@ -15,7 +17,8 @@ class FileAttachment(BaseModel):
     size: Optional[int] = None
 
 
-class Message(BaseModel):
+@dataclass(slots=True)
+class Message:
     """Chat message"""
     role: Literal["system", "user", "assistant"]
     content: str
@@ -32,14 +35,16 @@ class ChatCompletionRequest(BaseModel):
     top_k: Optional[int] = Field(None, gt=0)
 
 
-class Choice(BaseModel):
+@dataclass(slots=True)
+class Choice:
     """Response choice"""
     index: int
     message: Message
     finish_reason: str
 
 
-class Usage(BaseModel):
+@dataclass(slots=True)
+class Usage:
     """Token usage"""
     prompt_tokens: int
     completion_tokens: int
@@ -78,12 +83,13 @@ class RAGChatRequest(BaseModel):
     max_tokens: Optional[int] = Field(None, gt=0, le=4096)
 
 
-class RAGDocument(BaseModel):
+@dataclass(slots=True)
+class RAGDocument:
     """RAG document"""
     id: str
     text: str
     score: Optional[float] = None
-    metadata: Dict[str, Any] = {}
+    metadata: Dict[str, Any] = Field(default_factory=dict)
 
 
 class RAGQueryResponse(BaseModel):
@@ -107,7 +113,8 @@ class HealthResponse(BaseModel):
     rag_initialized: bool
 
 
-class ModelInfo(BaseModel):
+@dataclass(slots=True)
+class ModelInfo:
     """Model information"""
     id: str
     type: str
@@ -0,0 +1,117 @@
+"""
+Embedding Cache
+Persistent SQLite store of document embeddings keyed by content hash
+"""
+
+import hashlib
+import logging
+import os
+import sqlite3
+import threading
+from typing import Dict, Iterable, List, Tuple
+
+import numpy as np
+
+logger = logging.getLogger(__name__)
+
+
+class EmbeddingCache:
+    """Map (text hash, model name) to a previously computed embedding"""
+
+    def __init__(self, path: str, model_name: str, max_entries: int = 100000):
+        """
+        Open or create the cache database
+
+        Entries from a different embedding model are dropped on open, and
+        the oldest entries are pruned once max_entries is exceeded.
+
+        Args:
+            path: SQLite database file path
+            model_name: Embedding model name, part of every key
+            max_entries: Maximum number of stored embeddings (0 = unbounded)
+        """
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+
+        self.model_name = model_name
+        self.max_entries = max_entries
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(path, check_same_thread=False)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS embeddings (key TEXT PRIMARY KEY, vector BLOB NOT NULL)"
+        )
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS meta (name TEXT PRIMARY KEY, value TEXT NOT NULL)"
+        )
+
+        row = self._conn.execute("SELECT value FROM meta WHERE name = 'model_name'").fetchone()
+        if row is None or row[0] != model_name:
+            # Vectors from another model can never be hit again
+            deleted = self._conn.execute("DELETE FROM embeddings").rowcount
+            if deleted:
+                logger.info("Embedding model changed, dropped %s cached embeddings", deleted)
+            self._conn.execute(
+                "INSERT OR REPLACE INTO meta (name, value) VALUES ('model_name', ?)",
+                (model_name,)
+            )
+        self._conn.commit()
+
+    def key(self, text: str) -> str:
+        """Build the cache key for a text"""
+        digest = hashlib.blake2b(text.encode("utf-8"), digest_size=16).hexdigest()
+        return f"{digest}:{self.model_name}"
+
+    def get_many(self, keys: List[str]) -> Dict[str, List[float]]:
+        """
+        Fetch cached embeddings in a single query
+
+        Args:
+            keys: Cache keys from key()
+
+        Returns:
+            Dictionary of the keys that were found
+        """
+        if not keys:
+            return {}
+
+        placeholders = ",".join("?" * len(keys))
+        with self._lock:
+            rows = self._conn.execute(
+                f"SELECT key, vector FROM embeddings WHERE key IN ({placeholders})",
+                keys
+            ).fetchall()
+
+        return {key: np.frombuffer(blob, dtype=np.float32).tolist() for key, blob in rows}
+
+    def set_many(self, items: Iterable[Tuple[str, List[float]]]) -> None:
+        """
+        Store embeddings, replacing existing entries and pruning the
+        oldest beyond max_entries
+
+        Args:
+            items: (key, embedding) pairs
+        """
+        rows = [(key, np.asarray(vector, dtype=np.float32).tobytes()) for key, vector in items]
+        if not rows:
+            return
+
+        with self._lock:
+            self._conn.executemany(
+                "INSERT OR REPLACE INTO embeddings (key, vector) VALUES (?, ?)",
+                rows
+            )
+            if self.max_entries:
+                # Rowids grow with every write, so this keeps the newest entries
+                self._conn.execute(
+                    "DELETE FROM embeddings WHERE rowid IN "
+                    "(SELECT rowid FROM embeddings ORDER BY rowid DESC LIMIT -1 OFFSET ?)",
+                    (self.max_entries,)
+                )
+            self._conn.commit()
+
+    def close(self) -> None:
+        """Close the database connection"""
+        with self._lock:
+            self._conn.close()
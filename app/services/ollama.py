@@ -3,10 +3,11 @@ Ollama Client Service
 Handles communication with Ollama API for model inference
 """
 
+import asyncio
 import httpx
 import json
 import logging
-from typing import Optional, Dict, Any, AsyncIterator
+from typing import Optional, Dict, Any, AsyncIterator, Iterable
 
 from app.core.config import settings
 
@@ -23,9 +24,16 @@ class OllamaService:
         self.timeout = settings.model.timeout
         self.keep_alive = settings.model.keep_alive
         
-        self.client = httpx.AsyncClient(timeout=self.timeout)
+        # One pooled client for the app lifetime keeps connections to Ollama warm
+        self.client = httpx.AsyncClient(
+            timeout=self.timeout,
+            limits=httpx.Limits(
+                max_connections=settings.model.max_connections,
+                max_keepalive_connections=settings.model.max_keepalive_connections
+            )
+        )
         
-        logger.info(f"Ollama service initialized: {self.base_url}, model: {self.model_name}")
+        logger.info("Ollama service initialized: %s, model: %s", self.base_url, self.model_name)
     
     async def health_check(self) -> bool:
         """Check if Ollama service is running"""
@@ -33,7 +41,7 @@ class OllamaService:
             response = await self.client.get(f"{self.base_url}/api/tags")
             return response.status_code == 200
         except Exception as e:
-            logger.error(f"Ollama health check failed: {e}")
+            logger.error("Ollama health check failed: %s", e)
             return False
     
     async def list_models(self) -> list:
@@ -45,7 +53,7 @@ class OllamaService:
                 return data.get('models', [])
             return []
         except Exception as e:
-            logger.error(f"Failed to list models: {e}")
+            logger.error("Failed to list models: %s", e)
             return []
     
     async def get_running_models(self) -> list:
@@ -57,7 +65,7 @@ class OllamaService:
                 return data.get('models', [])
             return []
         except Exception as e:
-            logger.error(f"Failed to get running models: {e}")
+            logger.error("Failed to get running models: %s", e)
             return []
     
     async def chat(
@@ -67,7 +75,8 @@ class OllamaService:
         temperature: Optional[float] = None,
         top_p: Optional[float] = None,
         top_k: Optional[int] = None,
-        stream: bool = False
+        stream: bool = False,
+        usage: Optional[Dict[str, Any]] = None
     ) -> Any:
         """
         Chat completion using Ollama
@@ -79,6 +88,8 @@ class OllamaService:
             top_p: Nucleus sampling parameter
             top_k: Top-k sampling parameter
             stream: Whether to stream tokens
+            usage: Optional dict that a stream fills with 'prompt_eval_count'
+                and 'eval_count' from Ollama's final message
             
         Returns:
             Generated response or async iterator for streaming
@@ -104,7 +115,7 @@ class OllamaService:
         }
         
         if stream:
-            return self._chat_stream(payload)
+            return self._chat_stream(payload, usage)
         else:
             return await self._chat_non_stream(payload)
     
@@ -121,7 +132,7 @@ class OllamaService:
                 return {
                     'content': data.get('message', {}).get('content', ''),
                     'total_duration': data.get('total_duration', 0),
-                    'prompt_eval_count': data.get('prompt_eval_count', 0),
+                    'prompt_eval_count': data.get('prompt_eval_count'),
                     'eval_count': data.get('eval_count', 0)
                 }
             else:
@@ -133,10 +144,14 @@ class OllamaService:
             logger.error("Chat request to Ollama timed out")
             raise RuntimeError("Chat timeout")
         except Exception as e:
-            logger.error(f"Chat error: {e}")
+            logger.error("Chat error: %s", e)
             raise
     
-    async def _chat_stream(self, payload: Dict[str, Any]) -> AsyncIterator[str]:
+    async def _chat_stream(
+        self,
+        payload: Dict[str, Any],
+        usage: Optional[Dict[str, Any]] = None
+    ) -> AsyncIterator[str]:
         """Streaming chat"""
         try:
             async with self.client.stream(
@@ -153,31 +168,55 @@ class OllamaService:
                     if line.strip():
                         try:
                             data = json.loads(line)
-                            if 'message' in data and 'content' in data['message']:
-                                yield data['message']['content']
+                            # Single lookup per token; the final message carries
+                            # empty content, which is not worth a frame
+                            content = data.get('message', {}).get('content')
+                            if content:
+                                yield content
                             
                             if data.get('done', False):
+                                if usage is not None:
+                                    usage['prompt_eval_count'] = data.get('prompt_eval_count')
+                                    usage['eval_count'] = data.get('eval_count')
                                 break
                                 
                         except json.JSONDecodeError:
-                            logger.warning(f"Failed to decode JSON: {line}")
+                            logger.warning("Failed to decode JSON: %s", line)
                             continue
                             
         except httpx.TimeoutException:
             logger.error("Streaming chat request to Ollama timed out")
             raise RuntimeError("Chat streaming timeout")
         except Exception as e:
-            logger.error(f"Chat streaming error: {e}")
+            logger.error("Chat streaming error: %s", e)
             raise
     
     def count_tokens(self, text: str) -> int:
         """Estimate token count (approximate)"""
         return len(text) // 4
     
+    def count_tokens_iter(self, parts: Iterable[str]) -> int:
+        """
+        Estimate token count of text parts as if joined by single spaces
+        
+        Gives the same result as count_tokens(" ".join(parts)) without
+        building the joined string.
+        """
+        total_chars = 0
+        num_parts = 0
+        for part in parts:
+            total_chars += len(part)
+            num_parts += 1
+        
+        return (total_chars + max(num_parts - 1, 0)) // 4
+    
     async def get_model_info(self) -> Dict[str, Any]:
         """Get model information"""
-        models = await self.list_models()
-        running_models = await self.get_running_models()
+        # Both lookups are independent, so issue them concurrently
+        models, running_models = await asyncio.gather(
+            self.list_models(),
+            self.get_running_models()
+        )
         
         model_info = None
         for model in models:
@@ -232,7 +271,7 @@ class OllamaService:
                             continue
                             
         except Exception as e:
-            logger.error(f"Error pulling model {model_name}: {e}")
+            logger.error("Error pulling model %s: %s", model_name, e)
             raise
 
     async def create_model(self, model_name: str, modelfile_path: str = "Modelfile") -> AsyncIterator[Dict[str, Any]]:
@@ -279,7 +318,7 @@ class OllamaService:
                             continue
                             
         except Exception as e:
-            logger.error(f"Error creating model {model_name}: {e}")
+            logger.error("Error creating model %s: %s", model_name, e)
             raise
 
     async def delete_model(self, model_name: str) -> bool:
@@ -298,7 +337,7 @@ class OllamaService:
             is_running = any(m.get('name', '').startswith(model_name) for m in running_models)
             
             if is_running:
-                logger.info(f"Model {model_name} is running, unloading before deletion...")
+                logger.info("Model %s is running, unloading before deletion...", model_name)
                 # Unload by sending empty chat with keep_alive=0
                 try:
                     payload = {
@@ -308,7 +347,7 @@ class OllamaService:
                     }
                     await self.client.post(f"{self.base_url}/api/chat", json=payload)
                 except Exception as e:
-                    logger.warning(f"Failed to unload model before deletion: {e}")
+                    logger.warning("Failed to unload model before deletion: %s", e)
             
             # Now delete
             import json as json_lib
@@ -320,13 +359,13 @@ class OllamaService:
             )
             
             if response.status_code == 200:
-                logger.info(f"Successfully deleted model {model_name}")
+                logger.info("Successfully deleted model %s", model_name)
                 return True
             else:
-                logger.error(f"Failed to delete model {model_name}: {response.status_code} - {response.text}")
+                logger.error("Failed to delete model %s: %s - %s", model_name, response.status_code, response.text)
                 return False
         except Exception as e:
-            logger.error(f"Error deleting model {model_name}: {e}")
+            logger.error("Error deleting model %s: %s", model_name, e)
             raise
 
     async def unload_model(self) -> bool:
@@ -343,7 +382,7 @@ class OllamaService:
             await self.client.post(f"{self.base_url}/api/chat", json=payload)
             return True
         except Exception as e:
-            logger.error(f"Error unloading model: {e}")
+            logger.error("Error unloading model: %s", e)
             return False
 
     async def close(self):
@@ -7,7 +7,7 @@ import os
 import sys
 import logging
 import uuid
-from typing import List, Dict, Any, Optional
+from typing import TYPE_CHECKING, List, Dict, Any, Optional
 
 # MUST disable telemetry BEFORE importing chromadb
 os.environ["ANONYMIZED_TELEMETRY"] = "False"
@@ -33,12 +33,78 @@ except ImportError:
 
 import chromadb
 from chromadb.config import Settings
-from sentence_transformers import SentenceTransformer
 
 from app.core.config import settings
+from app.services.embedding_cache import EmbeddingCache
+from app.services.semantic_cache import SemanticCache
+
+if TYPE_CHECKING:
+    from sentence_transformers import SentenceTransformer
 
 logger = logging.getLogger(__name__)
 
+# Pre-quantized (dynamic int8) model files published alongside
+# sentence-transformers models, per backend
+INT8_MODEL_FILES = {
+    "onnx": "onnx/model_qint8_avx512_vnni.onnx",
+    "openvino": "openvino/openvino_model_qint8_quantized.xml",
+}
+
+# Marks documents created by the upload endpoint
+UPLOAD_SOURCE = "upload"
+
+# Keys every upload has carried since before the source marker existed
+_LEGACY_UPLOAD_KEYS = frozenset({"filename", "size", "uploaded_at", "doc_id", "format"})
+
+# Written to the persist directory once pre-marker uploads have been tagged
+UPLOAD_SOURCE_BACKFILL_MARKER = ".upload_source_backfilled"
+
+# Fixed wrapper around retrieved documents; kept constant so identical
+# retrievals produce a byte-identical prompt
+RAG_CONTEXT_TEMPLATE = (
+    "Retrieved Context:\n"
+    "{documents}\n"
+    "\n\nBased on the above context, please answer the following:"
+)
+
+
+def load_embedding_model(
+    model_name: str,
+    backend: str,
+    precision: str,
+    device: Optional[str] = None
+) -> "SentenceTransformer":
+    """
+    Load a SentenceTransformer on the configured backend and device
+    
+    Falls back to the default PyTorch FP32 model if the backend is not
+    installed or the model has no matching export. sentence-transformers
+    (and torch) are imported here rather than at module import, so only
+    processes that build a RAGService pay for them.
+    
+    Args:
+        model_name: Hugging Face model name or local path
+        backend: 'torch', 'onnx' or 'openvino'
+        precision: 'fp32' or 'int8'
+        device: Torch device; None picks CUDA/MPS when available
+        
+    Returns:
+        Loaded SentenceTransformer
+    """
+    from sentence_transformers import SentenceTransformer
+    
+    if backend == "torch":
+        return SentenceTransformer(model_name, device=device)
+    
+    try:
+        model_kwargs = None
+        if precision == "int8":
+            model_kwargs = {"file_name": INT8_MODEL_FILES[backend]}
+        return SentenceTransformer(model_name, device=device, backend=backend, model_kwargs=model_kwargs)
+    except Exception as e:
+        logger.warning("Could not load %s with %s/%s (%s), using torch/fp32", model_name, backend, precision, e)
+        return SentenceTransformer(model_name, device=device)
+
 
 class RAGService:
     """Service for RAG operations with ChromaDB"""
@@ -47,9 +113,11 @@ class RAGService:
         """Initialize RAG service with ChromaDB and embedding model"""
         # Initialize ChromaDB client
         persist_directory = settings.rag.chroma_persist_directory
+        self.persist_directory = persist_directory
         self.client = chromadb.PersistentClient(
             path=persist_directory,
             settings=Settings(
+                anonymized_telemetry=False,
                 allow_reset=True,
                 is_persistent=True
             )
@@ -57,22 +125,112 @@ class RAGService:
         
         # Load embedding model
         embedding_model_name = settings.rag.embedding_model
-        logger.info(f"Loading embedding model: {embedding_model_name}")
-        self.embedding_model = SentenceTransformer(embedding_model_name)
+        backend = settings.rag.embedding_backend
+        precision = settings.rag.embedding_precision
+        logger.info("Loading embedding model: %s (%s/%s)", embedding_model_name, backend, precision)
+        self.embedding_model = load_embedding_model(
+            embedding_model_name,
+            backend,
+            precision,
+            device=settings.rag.embedding_device or None
+        )
+        self.embedding_batch_size = settings.rag.embedding_batch_size
+        logger.info("Embedding model device: %s", self.embedding_model.device)
+        
+        # Quantized backends produce slightly different vectors, so keep
+        # their cached embeddings apart from the default model's
+        cache_model_name = embedding_model_name
+        if backend != "torch":
+            cache_model_name = f"{embedding_model_name}@{backend}-{precision}"
+        
+        # Persistent content-hash -> vector cache for document embeddings
+        self.embedding_cache: Optional[EmbeddingCache] = None
+        if settings.rag.embedding_cache_enabled:
+            self.embedding_cache = EmbeddingCache(
+                path=os.path.join(persist_directory, "embed_cache", "embeddings.sqlite3"),
+                model_name=cache_model_name,
+                max_entries=settings.rag.embedding_cache_max_entries
+            )
         
         # Get or create collection
         collection_name = settings.rag.collection_name
         try:
             self.collection = self.client.get_collection(name=collection_name)
-            logger.info(f"Using existing collection: {collection_name}")
+            logger.info("Using existing collection: %s", collection_name)
         except Exception:
             self.collection = self.client.create_collection(
                 name=collection_name,
-                metadata={"description": "Document collection for RAG"}
+                metadata={
+                    "description": "Document collection for RAG",
+                    "hnsw:space": settings.rag.hnsw_space,
+                    "hnsw:construction_ef": settings.rag.hnsw_construction_ef,
+                    "hnsw:M": settings.rag.hnsw_m,
+                    "hnsw:search_ef": settings.rag.hnsw_search_ef
+                }
             )
-            logger.info(f"Created new collection: {collection_name}")
+            logger.info("Created new collection: %s", collection_name)
         
         self.default_top_k = settings.rag.default_top_k
+        
+        # Query result and RAG response caches, invalidated on any document change
+        self.cache_enabled = settings.rag.semantic_cache_enabled
+        self.query_cache = SemanticCache(
+            maxsize=settings.rag.semantic_cache_size,
+            ttl=settings.rag.semantic_cache_ttl,
+            threshold=settings.rag.semantic_cache_threshold
+        )
+        self.response_cache = SemanticCache(
+            maxsize=settings.rag.semantic_cache_size,
+            ttl=settings.rag.semantic_cache_ttl,
+            threshold=settings.rag.semantic_cache_threshold
+        )
+        # Bumped on every invalidation; results computed before a bump are
+        # never written back to the caches
+        self.cache_generation = 0
+    
+    def _invalidate_caches(self) -> None:
+        """Drop cached query results after the collection changes"""
+        self.cache_generation += 1
+        self.query_cache.clear()
+        self.response_cache.clear()
+    
+    def _embed(self, texts: List[str]) -> List[List[float]]:
+        """
+        Embed document texts, reusing cached vectors for unchanged content
+        
+        Args:
+            texts: Texts to embed
+            
+        Returns:
+            One embedding per text, in order
+        """
+        if self.embedding_cache is None:
+            return self.embedding_model.encode(texts, batch_size=self.embedding_batch_size).tolist()
+        
+        keys = [self.embedding_cache.key(text) for text in texts]
+        cached = self.embedding_cache.get_many(keys)
+        
+        uncached_indices = [i for i, key in enumerate(keys) if key not in cached]
+        if uncached_indices:
+            uncached_texts = [texts[i] for i in uncached_indices]
+            vectors = self.embedding_model.encode(uncached_texts, batch_size=self.embedding_batch_size).tolist()
+            new_entries = [(keys[i], vector) for i, vector in zip(uncached_indices, vectors)]
+            self.embedding_cache.set_many(new_entries)
+            cached.update(new_entries)
+        
+        return [cached[key] for key in keys]
+    
+    def embed_query(self, text: str) -> List[float]:
+        """
+        Embed a query string
+        
+        Args:
+            text: Query text
+            
+        Returns:
+            Embedding vector
+        """
+        return self.embedding_model.encode(text).tolist()
     
     # Document Management Methods
     
@@ -94,9 +252,9 @@ class RAGService:
             Document ID
         """
         if doc_id is None:
-            doc_id = str(uuid.uuid4())
+            doc_id = uuid.uuid4().hex
         
-        embedding = self.embedding_model.encode(text).tolist()
+        embedding = self._embed([text])[0]
         
         self.collection.add(
             ids=[doc_id],
@@ -104,8 +262,9 @@ class RAGService:
             documents=[text],
             metadatas=[metadata or {}]
         )
+        self._invalidate_caches()
         
-        logger.info(f"Added document: {doc_id}")
+        logger.info("Added document: %s", doc_id)
         return doc_id
     
     def get_document(self, doc_id: str) -> Optional[Dict[str, Any]]:
@@ -129,7 +288,7 @@ class RAGService:
                 }
             return None
         except Exception as e:
-            logger.error(f"Error retrieving document {doc_id}: {e}")
+            logger.error("Error retrieving document %s: %s", doc_id, e)
             return None
     
     def update_document(
@@ -150,7 +309,7 @@ class RAGService:
             True if successful, False otherwise
         """
         try:
-            embedding = self.embedding_model.encode(text).tolist()
+            embedding = self._embed([text])[0]
             
             self.collection.update(
                 ids=[doc_id],
@@ -158,11 +317,12 @@ class RAGService:
                 documents=[text],
                 metadatas=[metadata or {}]
             )
+            self._invalidate_caches()
             
-            logger.info(f"Updated document: {doc_id}")
+            logger.info("Updated document: %s", doc_id)
             return True
         except Exception as e:
-            logger.error(f"Error updating document {doc_id}: {e}")
+            logger.error("Error updating document %s: %s", doc_id, e)
             return False
     
     def delete_document(self, doc_id: str) -> bool:
@@ -177,46 +337,99 @@ class RAGService:
         """
         try:
             self.collection.delete(ids=[doc_id])
-            logger.info(f"Deleted document: {doc_id}")
+            self._invalidate_caches()
+            logger.info("Deleted document: %s", doc_id)
             return True
         except Exception as e:
-            logger.error(f"Error deleting document {doc_id}: {e}")
+            logger.error("Error deleting document %s: %s", doc_id, e)
             return False
     
+    def update_metadata(self, doc_ids: List[str], metadatas: List[Dict[str, Any]]) -> None:
+        """
+        Replace the metadata of existing documents without re-embedding them
+        
+        Args:
+            doc_ids: IDs of the documents to update
+            metadatas: New metadata, one per ID
+        """
+        if not doc_ids:
+            return
+        self.collection.update(ids=doc_ids, metadatas=metadatas)
+        self._invalidate_caches()
+        logger.info("Updated metadata of %s documents", len(doc_ids))
+    
+    def backfill_upload_source(self) -> int:
+        """
+        Tag files uploaded before the source marker existed, once per store
+        
+        A marker file in the persist directory records that the backfill
+        has run, so later startups skip the metadata scan.
+        
+        Returns:
+            Number of documents tagged
+        """
+        marker_path = os.path.join(self.persist_directory, UPLOAD_SOURCE_BACKFILL_MARKER)
+        if os.path.exists(marker_path):
+            return 0
+        
+        # Uploads always recorded an integer size; range operators only match
+        # documents that have the key. Errors propagate so a failed scan is
+        # retried on the next startup rather than marked done.
+        candidates = self.collection.get(where={"size": {"$gte": 0}}, include=["metadatas"])
+        
+        doc_ids, metadatas = [], []
+        for doc_id, doc_metadata in zip(candidates['ids'], candidates['metadatas']):
+            if doc_metadata.get("source") == UPLOAD_SOURCE or not _LEGACY_UPLOAD_KEYS <= doc_metadata.keys():
+                continue
+            doc_ids.append(doc_id)
+            metadatas.append({**doc_metadata, "source": UPLOAD_SOURCE})
+        
+        self.update_metadata(doc_ids, metadatas)
+        with open(marker_path, "w"):
+            pass
+        return len(doc_ids)
+    
     def list_documents(
         self,
-        limit: int = 10,
-        offset: int = 0
+        limit: Optional[int] = 10,
+        offset: int = 0,
+        where: Optional[Dict[str, Any]] = None,
+        include_text: bool = True
     ) -> List[Dict[str, Any]]:
         """
         List documents in collection
         
+        Filtering and pagination are applied by ChromaDB.
+        
         Args:
-            limit: Maximum number of documents to return
+            limit: Maximum number of documents to return (None for all)
             offset: Number of documents to skip
+            where: Optional ChromaDB metadata filter
+            include_text: Whether to fetch document text
             
         Returns:
             List of document dictionaries
         """
         try:
-            result = self.collection.get()
-            
-            start = offset
-            end = offset + limit
+            include = ["documents", "metadatas"] if include_text else ["metadatas"]
+            result = self.collection.get(
+                where=where,
+                limit=limit,
+                offset=offset,
+                include=include
+            )
             
             documents = []
-            if result['ids']:
-                for i in range(start, min(end, len(result['ids']))):
-                    if i < len(result['ids']):
-                        documents.append({
-                            "id": result['ids'][i],
-                            "text": result['documents'][i],
-                            "metadata": result['metadatas'][i] if result['metadatas'] else {}
-                        })
+            for i, doc_id in enumerate(result['ids']):
+                document = {"id": doc_id}
+                if include_text:
+                    document["text"] = result['documents'][i]
+                document["metadata"] = result['metadatas'][i] if result['metadatas'] else {}
+                documents.append(document)
             
             return documents
         except Exception as e:
-            logger.error(f"Error listing documents: {e}")
+            logger.error("Error listing documents: %s", e)
             return []
     
     # Query and Search Methods
@@ -224,14 +437,19 @@ class RAGService:
     def query(
         self,
         query_text: str,
-        top_k: Optional[int] = None
+        top_k: Optional[int] = None,
+        query_embedding: Optional[List[float]] = None
     ) -> List[Dict[str, Any]]:
         """
         Semantic search for relevant documents
         
+        Results are served from the query cache on an exact or near-duplicate
+        query match.
+        
         Args:
             query_text: Search query text
             top_k: Number of results to return (defaults to config value)
+            query_embedding: Precomputed embedding of query_text
             
         Returns:
             List of matching documents with similarity scores
@@ -239,7 +457,20 @@ class RAGService:
         if top_k is None:
             top_k = self.default_top_k
         
-        query_embedding = self.embedding_model.encode(query_text).tolist()
+        params = (top_k,)
+        generation = self.cache_generation
+        if self.cache_enabled:
+            cached = self.query_cache.get(query_text, params)
+            if cached is not None:
+                return cached
+        
+        if query_embedding is None:
+            query_embedding = self.embed_query(query_text)
+        
+        if self.cache_enabled:
+            cached = self.query_cache.get_similar(query_embedding, params)
+            if cached is not None:
+                return cached
         
         results = self.collection.query(
             query_embeddings=[query_embedding],
@@ -256,13 +487,16 @@ class RAGService:
                     "metadata": results['metadatas'][0][i] if results['metadatas'] else {}
                 })
         
-        logger.info(f"Query returned {len(documents)} results")
+        logger.info("Query returned %s results", len(documents))
+        if self.cache_enabled and generation == self.cache_generation:
+            self.query_cache.set(query_text, documents, params, query_embedding)
         return documents
     
     def build_rag_context(
         self,
         query: str,
-        top_k: Optional[int] = None
+        top_k: Optional[int] = None,
+        query_embedding: Optional[List[float]] = None
     ) -> str:
         """
         Build context string from retrieved documents for RAG
@@ -270,25 +504,41 @@ class RAGService:
         Args:
             query: Search query
             top_k: Number of documents to retrieve
+            query_embedding: Precomputed embedding of query
             
         Returns:
             Formatted context string for LLM prompt
         """
-        results = self.query(query, top_k)
+        results = self.query(query, top_k, query_embedding)
         
         if not results:
             return ""
         
-        context_parts = ["Retrieved Context:"]
-        for i, doc in enumerate(results, 1):
-            context_parts.append(f"\n[{i}] {doc['text']}")
+        # Keep relevance order, breaking score ties by document ID so the same
+        # documents always produce the same prompt prefix for Ollama's KV cache
+        results = sorted(results, key=lambda doc: (-doc["score"], doc["id"]))
         
-        context_parts.append("\n\nBased on the above context, please answer the following:")
-        
-        return "\n".join(context_parts)
+        documents = "\n".join(
+            f"\n[{i}] {doc['text']}" for i, doc in enumerate(results, 1)
+        )
+        return RAG_CONTEXT_TEMPLATE.format(documents=documents)
     
     # Collection Statistics
     
+    def count_documents(self, where: Optional[Dict[str, Any]] = None) -> int:
+        """
+        Count documents, optionally matching a metadata filter
+        
+        Args:
+            where: Optional ChromaDB metadata filter
+            
+        Returns:
+            Number of matching documents
+        """
+        if where is None:
+            return self.collection.count()
+        return len(self.collection.get(where=where, include=[])['ids'])
+    
     def get_stats(self) -> Dict[str, Any]:
         """
         Get collection statistics
@@ -303,5 +553,10 @@ class RAGService:
                 "collection_name": self.collection.name
             }
         except Exception as e:
-            logger.error(f"Error getting stats: {e}")
+            logger.error("Error getting stats: %s", e)
             return {"total_documents": 0, "error": str(e)}
+    
+    def close(self) -> None:
+        """Close the embedding cache database"""
+        if self.embedding_cache is not None:
+            self.embedding_cache.close()
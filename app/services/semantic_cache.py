@@ -0,0 +1,162 @@
+"""
+Semantic Cache
+Two-tier query cache: exact match on the query string, then nearest
+cached query embedding above a cosine-similarity threshold
+
+Similarity lookups score every cached embedding with matching parameters
+in one matrix product, so their cost grows with maxsize; keep it in the
+low thousands.
+"""
+
+import hashlib
+import logging
+import threading
+from typing import Any, Dict, Hashable, List, Optional, Sequence, Tuple
+
+import numpy as np
+from cachetools import TTLCache
+
+logger = logging.getLogger(__name__)
+
+
+class SemanticCache:
+    """TTL-bounded cache for query results keyed by text and embedding"""
+
+    def __init__(self, maxsize: int = 1024, ttl: float = 300, threshold: float = 0.95):
+        """
+        Initialize cache
+
+        Args:
+            maxsize: Maximum number of cached queries
+            ttl: Seconds before an entry expires
+            threshold: Minimum cosine similarity for a semantic hit
+        """
+        self.threshold = threshold
+        # Callers run in worker threads; TTLCache is not thread-safe
+        self._lock = threading.Lock()
+        self._exact: TTLCache = TTLCache(maxsize=maxsize, ttl=ttl)
+        self._semantic: TTLCache = TTLCache(maxsize=maxsize, ttl=ttl)
+        # Per-params (embedding matrix, expiry times, values), rebuilt
+        # lazily after any write
+        self._index: Dict[Tuple[Hashable, ...], Optional[Tuple[np.ndarray, np.ndarray, List[Any]]]] = {}
+
+    @staticmethod
+    def _key(query: str, params: Tuple[Hashable, ...]) -> str:
+        """Hash the query together with the parameters that affect its result"""
+        raw = f"{params!r}\x00{query}".encode("utf-8")
+        return hashlib.sha256(raw).hexdigest()
+
+    @staticmethod
+    def _normalize(embedding: Sequence[float]) -> Optional[np.ndarray]:
+        """Return the embedding as a unit vector, or None if it is all zeros"""
+        vector = np.asarray(embedding, dtype=np.float32)
+        norm = np.linalg.norm(vector)
+        if not norm:
+            return None
+        return vector / norm
+
+    def get(self, query: str, params: Tuple[Hashable, ...] = ()) -> Optional[Any]:
+        """
+        Look up an exact query match
+
+        Args:
+            query: Sanitized query text
+            params: Parameters that must match (e.g. top_k, model)
+
+        Returns:
+            Cached value or None
+        """
+        key = self._key(query, params)
+        with self._lock:
+            return self._exact.get(key)
+
+    def get_similar(
+        self,
+        embedding: Sequence[float],
+        params: Tuple[Hashable, ...] = ()
+    ) -> Optional[Any]:
+        """
+        Look up the most similar cached query with matching parameters
+
+        Args:
+            embedding: Query embedding
+            params: Parameters that must match (e.g. top_k, model)
+
+        Returns:
+            Cached value if similarity >= threshold, otherwise None
+        """
+        vector = self._normalize(embedding)
+        if vector is None:
+            return None
+
+        with self._lock:
+            if params in self._index:
+                index = self._index[params]
+            else:
+                index = self._build_index(params)
+            now = self._semantic.timer()
+        if index is None:
+            return None
+
+        # The index is a snapshot, so it is scored outside the lock
+        matrix, expires, values = index
+        scores = matrix @ vector
+        scores[expires <= now] = -np.inf
+        best = int(np.argmax(scores))
+        best_score = float(scores[best])
+        if best_score < self.threshold:
+            return None
+
+        logger.debug("Semantic cache hit (similarity %.3f)", best_score)
+        return values[best]
+
+    def _build_index(
+        self,
+        params: Tuple[Hashable, ...]
+    ) -> Optional[Tuple[np.ndarray, np.ndarray, List[Any]]]:
+        """Stack the live embeddings cached for params into one matrix; call with the lock held"""
+        self._semantic.expire()
+        entries = [entry for entry in self._semantic.values() if entry[0] == params]
+        index = None
+        if entries:
+            index = (
+                np.stack([entry[1] for entry in entries]),
+                np.array([entry[2] for entry in entries]),
+                [entry[3] for entry in entries]
+            )
+        self._index[params] = index
+        return index
+
+    def set(
+        self,
+        query: str,
+        value: Any,
+        params: Tuple[Hashable, ...] = (),
+        embedding: Optional[Sequence[float]] = None
+    ) -> None:
+        """
+        Store a value for a query
+
+        Args:
+            query: Sanitized query text
+            value: Value to cache
+            params: Parameters the value depends on
+            embedding: Optional query embedding for similarity lookups
+        """
+        key = self._key(query, params)
+        vector = self._normalize(embedding) if embedding is not None else None
+
+        with self._lock:
+            self._exact[key] = value
+            if vector is not None:
+                expires = self._semantic.timer() + self._semantic.ttl
+                self._semantic[key] = (params, vector, expires, value)
+                # The write may also have evicted entries of other params
+                self._index.clear()
+
+    def clear(self) -> None:
+        """Drop all cached entries"""
+        with self._lock:
+            self._exact.clear()
+            self._semantic.clear()
+            self._index.clear()
@@ -3,10 +3,12 @@ File Processing Utilities
 Extract text content from various file formats
 """
 
+import asyncio
 import logging
+from concurrent.futures import Executor
 import mimetypes
 from pathlib import Path
-from typing import Optional, Dict, Any
+from typing import Optional, Dict, Any, Union
 import io
 
 logger = logging.getLogger(__name__)
@@ -41,6 +43,12 @@ class FileProcessor:
         '.htm': 'text/html',
     }
     
+    # Extensions decoded directly as UTF-8 text
+    TEXT_EXTENSIONS = frozenset({
+        '.txt', '.md', '.py', '.js', '.ts', '.java', '.cpp', '.c', '.go', '.rs', '.tf',
+        '.json', '.xml', '.yaml', '.yml', '.sh', '.html', '.htm', '.csv'
+    })
+    
     @staticmethod
     def is_supported(filename: str) -> bool:
         """Check if file type is supported"""
@@ -55,7 +63,46 @@ class FileProcessor:
     
     @staticmethod
     async def extract_text(
-        file_content: bytes,
+        file_content: Union[bytes, bytearray],
+        filename: str,
+        mime_type: Optional[str] = None,
+        executor: Optional[Executor] = None
+    ) -> Dict[str, Any]:
+        """
+        Extract text content from file without blocking the event loop
+        
+        Parsing runs in the given executor, or a worker thread if none is
+        provided; see extract_text_sync.
+        
+        Args:
+            file_content: Raw file bytes
+            filename: Original filename
+            mime_type: Optional MIME type override
+            executor: Optional executor (e.g. a process pool) to parse in
+            
+        Returns:
+            Dictionary with 'text', 'metadata', and 'format' keys
+        """
+        if executor is not None:
+            loop = asyncio.get_running_loop()
+            return await loop.run_in_executor(
+                executor,
+                FileProcessor.extract_text_sync,
+                file_content,
+                filename,
+                mime_type
+            )
+        
+        return await asyncio.to_thread(
+            FileProcessor.extract_text_sync,
+            file_content,
+            filename,
+            mime_type
+        )
+    
+    @staticmethod
+    def extract_text_sync(
+        file_content: Union[bytes, bytearray],
         filename: str,
         mime_type: Optional[str] = None
     ) -> Dict[str, Any]:
@@ -77,7 +124,7 @@ class FileProcessor:
         
         try:
             # Text-based files
-            if mime_type and mime_type.startswith('text/') or ext in ['.txt', '.md', '.py', '.js', '.ts', '.java', '.cpp', '.c', '.go', '.rs', '.tf', '.json', '.xml', '.yaml', '.yml', '.sh', '.html', '.htm', '.csv']:
+            if mime_type and mime_type.startswith('text/') or ext in FileProcessor.TEXT_EXTENSIONS:
                 text = file_content.decode('utf-8', errors='ignore')
                 return {
                     'text': text,
@@ -91,7 +138,7 @@ class FileProcessor:
             
             # PDF files
             elif ext == '.pdf':
-                text = await FileProcessor._extract_pdf(file_content)
+                text = FileProcessor._extract_pdf(file_content)
                 return {
                     'text': text,
                     'format': 'pdf',
@@ -104,7 +151,7 @@ class FileProcessor:
             
             # DOCX files
             elif ext == '.docx':
-                text = await FileProcessor._extract_docx(file_content)
+                text = FileProcessor._extract_docx(file_content)
                 return {
                     'text': text,
                     'format': 'docx',
@@ -134,12 +181,26 @@ class FileProcessor:
                 raise ValueError(f"Unsupported file format: {ext}")
         
         except Exception as e:
-            logger.error(f"Error extracting text from {filename}: {e}")
+            logger.error("Error extracting text from %s: %s", filename, e)
             raise ValueError(f"Failed to extract text from {filename}: {str(e)}")
     
     @staticmethod
-    async def _extract_pdf(file_content: bytes) -> str:
-        """Extract text from PDF file"""
+    def _extract_pdf(file_content: Union[bytes, bytearray]) -> str:
+        """Extract text from PDF file, preferring PyMuPDF over PyPDF2"""
+        try:
+            import fitz
+        except ImportError:
+            return FileProcessor._extract_pdf_pypdf2(file_content)
+        
+        try:
+            with fitz.open(stream=file_content, filetype="pdf") as doc:
+                return '\n\n'.join(page.get_text("text") for page in doc)
+        except Exception as e:
+            raise ValueError(f"Failed to extract PDF text: {str(e)}")
+    
+    @staticmethod
+    def _extract_pdf_pypdf2(file_content: Union[bytes, bytearray]) -> str:
+        """Extract text from PDF file with PyPDF2"""
         try:
             import PyPDF2
             
@@ -154,12 +215,12 @@ class FileProcessor:
             return '\n\n'.join(text_parts)
         
         except ImportError:
-            raise ValueError("PyPDF2 not installed. Run: pip install PyPDF2")
+            raise ValueError("No PDF backend installed. Run: pip install pymupdf")
         except Exception as e:
             raise ValueError(f"Failed to extract PDF text: {str(e)}")
     
     @staticmethod
-    async def _extract_docx(file_content: bytes) -> str:
+    def _extract_docx(file_content: Union[bytes, bytearray]) -> str:
         """Extract text from DOCX file"""
         try:
             import docx
@@ -215,3 +276,7 @@ class FileProcessor:
             'size_mb': round(file_size / (1024 * 1024), 2),
             'supported': FileProcessor.is_supported(filename)
         }
+
+
+# Precomputed list of supported extensions for error messages
+SUPPORTED_EXTENSIONS_STR = ', '.join(FileProcessor.SUPPORTED_EXTENSIONS)
@@ -3,13 +3,21 @@ Utility Functions
 Validation, sanitization, and helper functions
 """
 
+import asyncio
 import json
 import logging
-from datetime import datetime
-from typing import Optional
+from datetime import datetime, timezone
+from typing import AsyncIterator, Optional
 
 logger = logging.getLogger(__name__)
 
+# Pre-encoded SSE framing for streamed endpoints
+SSE_PREFIX = b"data: "
+SSE_SUFFIX = b"\n\n"
+SSE_DONE = SSE_PREFIX + b"[DONE]" + SSE_SUFFIX
+# Stop reverse proxies (e.g. nginx) from buffering the event stream
+SSE_HEADERS = {"Cache-Control": "no-cache", "X-Accel-Buffering": "no"}
+
 
 def validate_prompt(prompt: str, max_length: int = 4096) -> bool:
     """Validate prompt length and content"""
@@ -42,8 +50,12 @@ def log_request(
     error: Optional[str] = None
 ) -> None:
     """Log API request with metrics"""
+    # Skip building and serializing the record if it would be dropped
+    if not logger.isEnabledFor(logging.ERROR if error else logging.INFO):
+        return
+    
     log_data = {
-        "timestamp": datetime.utcnow().isoformat(),
+        "timestamp": datetime.now(timezone.utc).isoformat(),
         "endpoint": endpoint,
         "input_tokens": input_tokens,
         "output_tokens": output_tokens,
@@ -54,6 +66,81 @@ def log_request(
     
     if error:
         log_data["error"] = error
-        logger.error(f"Request failed: {json.dumps(log_data)}")
+        logger.error("Request failed: %s", json.dumps(log_data))
     else:
-        logger.info(f"Request completed: {json.dumps(log_data)}")
+        logger.info("Request completed: %s", json.dumps(log_data))
+
+
+async def coalesce_stream(
+    stream: AsyncIterator[str],
+    max_chars: int = 64,
+    max_delay: float = 0.02
+) -> AsyncIterator[str]:
+    """
+    Coalesce streamed tokens into larger chunks
+    
+    Args:
+        stream: Async iterator of text tokens
+        max_chars: Number of buffered characters that triggers a flush;
+            1 or less passes tokens through unchanged
+        max_delay: Maximum seconds to hold buffered tokens, even if no
+            further token arrives
+        
+    Yields:
+        Concatenated token chunks
+    """
+    if max_chars <= 1:
+        async for text in stream:
+            yield text
+        return
+    
+    # At most one read of the source is in flight. It is kept (not
+    # cancelled) when the flush timer fires, and a new one is only started
+    # once the consumer asks for more, so a slow consumer holds the source
+    # to less than max_chars of buffered text plus one token.
+    source = stream.__aiter__()
+    loop = asyncio.get_running_loop()
+    pending: Optional[asyncio.Future] = None
+    buffer = []
+    buffered = 0
+    deadline = 0.0
+    
+    try:
+        while True:
+            if pending is None:
+                pending = asyncio.ensure_future(source.__anext__())
+            if buffer:
+                done, _ = await asyncio.wait((pending,), timeout=deadline - loop.time())
+                if not done:
+                    yield ''.join(buffer)
+                    buffer.clear()
+                    buffered = 0
+                    continue
+            else:
+                await asyncio.wait((pending,))
+            
+            read, pending = pending, None
+            try:
+                text = read.result()
+            except StopAsyncIteration:
+                break
+            except Exception:
+                # Deliver what was read before the source failed
+                if buffer:
+                    yield ''.join(buffer)
+                raise
+            
+            if not buffer:
+                deadline = loop.time() + max_delay
+            buffer.append(text)
+            buffered += len(text)
+            if buffered >= max_chars:
+                yield ''.join(buffer)
+                buffer.clear()
+                buffered = 0
+        
+        if buffer:
+            yield ''.join(buffer)
+    finally:
+        if pending is not None:
+            pending.cancel()
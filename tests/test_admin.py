@@ -1,6 +1,6 @@
 import pytest
 from fastapi.testclient import TestClient
-from unittest.mock import AsyncMock, patch, MagicMock
+from unittest.mock import AsyncMock, patch
 from app.main import app
 from app.services.ollama import OllamaService
 
@@ -35,19 +35,19 @@ def test_get_config():
     assert "model" in data
 
 def test_update_config():
-    # Save original config first to restore later (or mock the file write)
-    # For this test we'll just check if the endpoint accepts the data
-    # In a real scenario we'd mock the file operations
-    
-    with patch("builtins.open", MagicMock()) as mock_open:
-        with patch("yaml.dump") as mock_dump:
-            payload = {
-                "server": {"port": 9000},
-                "model": {"model_name": "new-model"}
-            }
-            response = client.post("/v1/admin/config", json=payload)
-            assert response.status_code == 200
-            assert response.json()["status"] == "success"
+    # Mock the file write so the real config is left untouched
+    with patch("app.api.v1.endpoints.admin.save_config_file") as mock_save:
+        payload = {
+            "server": {"port": 9000},
+            "model": {"model_name": "new-model"}
+        }
+        response = client.post("/v1/admin/config", json=payload)
+        assert response.status_code == 200
+        assert response.json()["status"] == "success"
+        
+        saved_config = mock_save.call_args[0][0]
+        assert saved_config["server"]["port"] == 9000
+        assert saved_config["model"]["model_name"] == "new-model"
 
 def test_list_models(mock_ollama_service):
     response = client.get("/v1/admin/models")
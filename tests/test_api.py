@@ -3,9 +3,27 @@ API Tests
 Test health and basic endpoints
 """
 
+import json
+from unittest.mock import AsyncMock, MagicMock
+
 import pytest
+from fastapi import FastAPI, Request
 from fastapi.testclient import TestClient
 
+from app.core.config import settings
+from app.core.middleware import RequestSizeLimitMiddleware
+from app.main import app
+
+
+@pytest.fixture
+def mock_rag_service():
+    """Attach a mock RAG service to the app"""
+    mock = MagicMock()
+    mock.add_document.return_value = "doc-1"
+    app.state.rag_service = mock
+    yield mock
+    del app.state.rag_service
+
 
 def test_root_endpoint(client: TestClient):
     """Test root endpoint"""
@@ -31,3 +49,83 @@ def test_models_endpoint(client: TestClient):
     """Test models endpoint"""
     response = client.get("/v1/models")
     assert response.status_code in [200, 503]  # May fail if Ollama not running
+
+
+def test_upload_rejects_source_metadata(client: TestClient, mock_rag_service):
+    """Test clients cannot set the upload source marker"""
+    response = client.post(
+        "/v1/files/upload",
+        files={"file": ("main.tf", b"resource {}")},
+        data={"metadata": json.dumps({"source": "upload"})}
+    )
+    assert response.status_code == 400
+    mock_rag_service.add_document.assert_not_called()
+
+
+def test_upload_server_metadata_wins(client: TestClient, mock_rag_service):
+    """Test client metadata is kept but server keys overwrite it"""
+    response = client.post(
+        "/v1/files/upload",
+        files={"file": ("main.tf", b"resource {}")},
+        data={"metadata": json.dumps({"type": "module", "team": "infra"})}
+    )
+    assert response.status_code == 200
+    metadata = mock_rag_service.add_document.call_args.kwargs["metadata"]
+    assert metadata["team"] == "infra"
+    assert metadata["type"] == "text"
+    assert metadata["source"] == "upload"
+
+
+def test_request_size_limit_rejects_declared_length():
+    """Test limited paths reject a Content-Length over the limit before reading the body"""
+    limited_app = FastAPI()
+    limited_app.add_middleware(RequestSizeLimitMiddleware, max_request_size=8, paths=["/upload"])
+
+    @limited_app.post("/upload")
+    @limited_app.post("/other")
+    async def echo(request: Request):
+        return {"size": len(await request.body())}
+
+    limited_client = TestClient(limited_app)
+    assert limited_client.post("/upload", content=b"x" * 9).status_code == 413
+    assert limited_client.post("/upload", content=b"x" * 8).status_code == 200
+    assert limited_client.post("/other", content=b"x" * 9).status_code == 200
+
+
+def test_upload_accepts_file_at_size_limit(client: TestClient, mock_rag_service):
+    """Test multipart overhead does not count against the per-file limit"""
+    content = b"x" * settings.security.max_request_size
+    response = client.post(
+        "/v1/files/upload",
+        files={"file": ("main.tf", content)},
+        data={"store_in_rag": "false", "metadata": json.dumps({"team": "infra"})}
+    )
+    assert response.status_code == 200
+    assert response.json()["size"] == len(content)
+
+
+def test_upload_rejects_oversized_file(client: TestClient, mock_rag_service, monkeypatch):
+    """Test the upload read loop stops once the file exceeds the size limit"""
+    monkeypatch.setattr(settings.security, "max_request_size", 16)
+    response = client.post("/v1/files/upload", files={"file": ("main.tf", b"x" * 17)})
+    assert response.status_code == 413
+    mock_rag_service.add_document.assert_not_called()
+
+
+def test_chat_completion_non_streaming(client: TestClient):
+    """Test the non-streaming body matches ChatCompletionResponse"""
+    ollama = MagicMock()
+    ollama.chat = AsyncMock(return_value={"content": "ok", "eval_count": 2, "prompt_eval_count": 5})
+    app.state.ollama_service = ollama
+    try:
+        response = client.post(
+            "/v1/chat/completions",
+            json={"messages": [{"role": "user", "content": "hi"}]}
+        )
+    finally:
+        del app.state.ollama_service
+    assert response.status_code == 200
+    data = response.json()
+    assert data["object"] == "chat.completion"
+    assert data["choices"][0]["message"] == {"role": "assistant", "content": "ok"}
+    assert data["usage"] == {"prompt_tokens": 5, "completion_tokens": 2, "total_tokens": 7}
@@ -0,0 +1,72 @@
+"""
+Chat Tests
+Test attachment decoding
+"""
+
+import asyncio
+import base64
+
+from app.api.v1.endpoints.chat import _maybe_b64decode, _process_attachment
+from app.schemas.requests import FileAttachment
+
+TERRAFORM = b'resource "aws_s3_bucket" "logs" {\n  bucket = "logs"\n}\n' * 4
+
+
+def test_maybe_b64decode_plain_base64():
+    """Test single-line base64 is decoded"""
+    assert _maybe_b64decode(base64.b64encode(TERRAFORM).decode()) == TERRAFORM
+
+
+def test_maybe_b64decode_wrapped_base64():
+    """Test MIME-style line-wrapped base64 is decoded"""
+    wrapped = base64.encodebytes(TERRAFORM).decode()
+    assert "\n" in wrapped.strip()
+    assert _maybe_b64decode(wrapped) == TERRAFORM
+
+
+def test_maybe_b64decode_plain_text():
+    """Test text that is not base64 is left alone"""
+    assert _maybe_b64decode('variable "region" {}') is None
+    assert _maybe_b64decode("abc") is None
+
+
+def test_maybe_b64decode_space_separated_words():
+    """Test words whose letters happen to form valid base64 are not decoded"""
+    assert _maybe_b64decode("test data") is None
+    assert _maybe_b64decode("variable name") is None
+
+
+def test_process_attachment_plain_text():
+    """Test plain text attachments are inlined as-is"""
+    attachment = FileAttachment(filename="notes.txt", content="use us-east-1")
+    result = asyncio.run(_process_attachment(attachment))
+    assert result == "\n\n--- notes.txt ---\nuse us-east-1"
+
+
+def test_process_attachment_space_separated_words():
+    """Test plain space-separated words pass through unchanged"""
+    attachment = FileAttachment(filename="notes.txt", content="test data")
+    result = asyncio.run(_process_attachment(attachment))
+    assert result == "\n\n--- notes.txt ---\ntest data"
+
+
+def test_process_attachment_wrapped_base64():
+    """Test line-wrapped base64 attachments are decoded and extracted"""
+    attachment = FileAttachment(filename="main.tf", content=base64.encodebytes(TERRAFORM).decode())
+    result = asyncio.run(_process_attachment(attachment))
+    assert result == f"\n\n--- Content from main.tf ---\n{TERRAFORM.decode()}"
+
+
+def test_process_attachment_data_uri():
+    """Test data URI attachments are decoded and extracted"""
+    content = "data:text/plain;base64," + base64.b64encode(TERRAFORM).decode()
+    attachment = FileAttachment(filename="main.tf", content=content)
+    result = asyncio.run(_process_attachment(attachment))
+    assert result == f"\n\n--- Content from main.tf ---\n{TERRAFORM.decode()}"
+
+
+def test_process_attachment_malformed_data_uri():
+    """Test a data URI without a comma is reported as an error"""
+    attachment = FileAttachment(filename="main.tf", content="data:text/plain;base64")
+    result = asyncio.run(_process_attachment(attachment))
+    assert result == "\n\n--- Error processing main.tf: Malformed data URI ---"
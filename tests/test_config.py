@@ -0,0 +1,21 @@
+"""
+Config Tests
+Test settings loading from YAML
+"""
+
+import yaml
+
+from app.core.config import Settings
+
+
+def test_from_yaml_ignores_stream_chunk_size(tmp_path):
+    """Test a config file with the retired stream_chunk_size key still loads"""
+    config_path = tmp_path / "server_config.yaml"
+    config_path.write_text(yaml.safe_dump({
+        "inference": {"stream_chunk_size": 1, "stream_max_delay_ms": 50}
+    }))
+
+    loaded = Settings.from_yaml(str(config_path))
+    assert loaded.inference.stream_max_delay_ms == 50
+    assert loaded.inference.stream_flush_chars == 64
+    assert not hasattr(loaded.inference, "stream_chunk_size")
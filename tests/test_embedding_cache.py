@@ -0,0 +1,51 @@
+"""
+Embedding Cache Tests
+Test persistent embedding lookups
+"""
+
+from app.services.embedding_cache import EmbeddingCache
+
+
+def test_roundtrip(tmp_path):
+    """Test stored vectors are returned by key"""
+    cache = EmbeddingCache(str(tmp_path / "embed_cache" / "embeddings.sqlite3"), "model-a")
+    key = cache.key("resource \"aws_vpc\" \"main\" {}")
+    cache.set_many([(key, [0.5, -1.0, 2.0])])
+
+    assert cache.get_many([key, cache.key("missing")]) == {key: [0.5, -1.0, 2.0]}
+    cache.close()
+
+
+def test_key_includes_model(tmp_path):
+    """Test the same text maps to different keys per model"""
+    path = str(tmp_path / "embeddings.sqlite3")
+    assert EmbeddingCache(path, "model-a").key("text") != EmbeddingCache(path, "model-b").key("text")
+
+
+def test_model_change_clears_cache(tmp_path):
+    """Test reopening with another model drops the old model's vectors"""
+    path = str(tmp_path / "embeddings.sqlite3")
+    cache = EmbeddingCache(path, "model-a")
+    old_key = cache.key("text")
+    cache.set_many([(old_key, [1.0])])
+    cache.close()
+
+    EmbeddingCache(path, "model-a").close()
+    reopened = EmbeddingCache(path, "model-a")
+    assert reopened.get_many([old_key]) == {old_key: [1.0]}
+    reopened.close()
+
+    changed = EmbeddingCache(path, "model-b")
+    assert changed._conn.execute("SELECT COUNT(*) FROM embeddings").fetchone()[0] == 0
+    changed.close()
+
+
+def test_prunes_oldest_entries(tmp_path):
+    """Test the cache keeps only the newest max_entries embeddings"""
+    cache = EmbeddingCache(str(tmp_path / "embeddings.sqlite3"), "model-a", max_entries=2)
+    keys = [cache.key(text) for text in ("a", "b", "c")]
+    for key in keys:
+        cache.set_many([(key, [1.0])])
+
+    assert set(cache.get_many(keys)) == set(keys[1:])
+    cache.close()
@@ -0,0 +1,93 @@
+"""
+Helper Tests
+Test utility functions
+"""
+
+import asyncio
+
+from app.utils.helpers import coalesce_stream
+
+
+async def _tokens(*parts):
+    for part in parts:
+        yield part
+
+
+async def _collect(stream):
+    return [chunk async for chunk in stream]
+
+
+def test_coalesce_stream_passthrough():
+    """Test max_chars of 1 yields tokens unchanged"""
+    chunks = asyncio.run(_collect(coalesce_stream(_tokens("a", "b", "c"), max_chars=1)))
+    assert chunks == ["a", "b", "c"]
+
+
+def test_coalesce_stream_groups_tokens():
+    """Test tokens are grouped and the remainder is flushed"""
+    stream = coalesce_stream(_tokens("a", "b", "c", "d", "e"), max_chars=2, max_delay=60)
+    chunks = asyncio.run(_collect(stream))
+    assert chunks == ["ab", "cd", "e"]
+
+
+def test_coalesce_stream_counts_characters():
+    """Test the flush threshold counts buffered characters, not tokens"""
+    stream = coalesce_stream(_tokens("abc", "d", "efgh", "i"), max_chars=4, max_delay=60)
+    chunks = asyncio.run(_collect(stream))
+    assert chunks == ["abcd", "efgh", "i"]
+
+
+def test_coalesce_stream_flushes_on_timeout():
+    """Test buffered tokens are flushed when the source stalls"""
+    async def slow_tokens():
+        yield "a"
+        await asyncio.sleep(0.2)
+        yield "b"
+    
+    stream = coalesce_stream(slow_tokens(), max_chars=10, max_delay=0.01)
+    chunks = asyncio.run(_collect(stream))
+    assert chunks == ["a", "b"]
+
+
+def test_coalesce_stream_propagates_errors():
+    """Test errors from the source stream reach the consumer"""
+    async def failing_tokens():
+        yield "a"
+        raise RuntimeError("boom")
+    
+    async def run():
+        chunks = []
+        try:
+            async for chunk in coalesce_stream(failing_tokens(), max_chars=10):
+                chunks.append(chunk)
+        except RuntimeError as e:
+            return chunks, str(e)
+    
+    assert asyncio.run(run()) == (["a"], "boom")
+
+
+def test_coalesce_stream_pauses_source_for_slow_consumer():
+    """Test the source is not read while the consumer is not reading"""
+    produced = []
+    
+    async def counted_tokens():
+        for i in range(100):
+            produced.append(i)
+            yield str(i)
+    
+    async def run():
+        stream = coalesce_stream(counted_tokens(), max_chars=2, max_delay=60)
+        first = await stream.__anext__()
+        read_at_flush = len(produced)
+        # A stalled client: the producer gets plenty of time to run ahead
+        await asyncio.sleep(0.05)
+        read_after_stall = len(produced)
+        second = await stream.__anext__()
+        await stream.aclose()
+        return first, second, read_at_flush, read_after_stall
+    
+    first, second, read_at_flush, read_after_stall = asyncio.run(run())
+    assert (first, second) == ("01", "23")
+    # Read-ahead is bounded by the flush threshold: 2 characters here
+    assert read_at_flush == 2
+    assert read_after_stall == read_at_flush
@@ -0,0 +1,73 @@
+"""
+RAG Service Tests
+Test document maintenance without loading an embedding model
+"""
+
+import sqlite3
+import uuid
+
+import chromadb
+import pytest
+
+from app.services.embedding_cache import EmbeddingCache
+from app.services.rag import RAGService, UPLOAD_SOURCE, UPLOAD_SOURCE_BACKFILL_MARKER
+from app.services.semantic_cache import SemanticCache
+
+
+@pytest.fixture
+def rag(tmp_path):
+    """RAG service over an in-memory collection"""
+    service = RAGService.__new__(RAGService)
+    service.persist_directory = str(tmp_path)
+    service.collection = chromadb.EphemeralClient().create_collection(name=uuid.uuid4().hex)
+    service.query_cache = SemanticCache(maxsize=8, ttl=60, threshold=0.95)
+    service.response_cache = SemanticCache(maxsize=8, ttl=60, threshold=0.95)
+    service.cache_generation = 0
+    service.embedding_cache = None
+    return service
+
+
+def _upload_metadata(doc_id, **extra):
+    return {
+        "filename": f"{doc_id}.txt", "size": 10, "uploaded_at": "2024-01-01T00:00:00+00:00",
+        "doc_id": doc_id, "format": "txt", **extra
+    }
+
+
+def test_backfill_upload_source_tags_legacy_uploads(rag):
+    """Test only untagged uploads get the source marker"""
+    rag.collection.add(
+        ids=["legacy", "tagged", "other"],
+        embeddings=[[0.1, 0.2], [0.3, 0.4], [0.5, 0.6]],
+        documents=["a", "b", "c"],
+        metadatas=[
+            _upload_metadata("legacy"),
+            _upload_metadata("tagged", source=UPLOAD_SOURCE),
+            {"size": 3}
+        ]
+    )
+
+    assert rag.backfill_upload_source() == 1
+    assert rag.collection.get(ids=["legacy"])["metadatas"][0]["source"] == UPLOAD_SOURCE
+    assert "source" not in rag.collection.get(ids=["other"])["metadatas"][0]
+
+
+def test_backfill_upload_source_runs_once(rag, tmp_path):
+    """Test the backfill records a marker and skips later runs"""
+    assert rag.backfill_upload_source() == 0
+    assert (tmp_path / UPLOAD_SOURCE_BACKFILL_MARKER).exists()
+
+    rag.collection.add(
+        ids=["legacy"], embeddings=[[0.1, 0.2]], documents=["a"],
+        metadatas=[_upload_metadata("legacy")]
+    )
+    assert rag.backfill_upload_source() == 0
+    assert "source" not in rag.collection.get(ids=["legacy"])["metadatas"][0]
+
+
+def test_close_closes_embedding_cache(rag, tmp_path):
+    """Test close releases the embedding cache connection"""
+    rag.embedding_cache = EmbeddingCache(path=str(tmp_path / "embeddings.sqlite3"), model_name="test")
+    rag.close()
+    with pytest.raises(sqlite3.ProgrammingError):
+        rag.embedding_cache.get_many(["missing"])
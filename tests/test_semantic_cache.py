@@ -0,0 +1,59 @@
+"""
+Semantic Cache Tests
+Test exact and similarity lookups
+"""
+
+import time
+
+from app.services.semantic_cache import SemanticCache
+
+
+def test_exact_match():
+    """Test values are returned only for the same query and params"""
+    cache = SemanticCache()
+    cache.set("what is a vpc", ["doc"], params=(3,))
+
+    assert cache.get("what is a vpc", (3,)) == ["doc"]
+    assert cache.get("what is a vpc", (5,)) is None
+    assert cache.get("what is a subnet", (3,)) is None
+
+
+def test_similar_match():
+    """Test near-duplicate embeddings hit above the threshold"""
+    cache = SemanticCache(threshold=0.95)
+    cache.set("what is a vpc", "answer", params=(3,), embedding=[1.0, 0.0, 0.0])
+
+    assert cache.get_similar([0.99, 0.05, 0.0], (3,)) == "answer"
+    assert cache.get_similar([0.0, 1.0, 0.0], (3,)) is None
+    assert cache.get_similar([1.0, 0.0, 0.0], (5,)) is None
+
+
+def test_clear():
+    """Test clear drops both tiers"""
+    cache = SemanticCache()
+    cache.set("q", "a", embedding=[1.0, 0.0])
+    cache.clear()
+
+    assert cache.get("q") is None
+    assert cache.get_similar([1.0, 0.0]) is None
+
+
+def test_similar_match_sees_new_entries():
+    """Test entries stored after a lookup are found by the next one"""
+    cache = SemanticCache(threshold=0.95)
+    cache.set("what is a vpc", "vpc", params=(3,), embedding=[1.0, 0.0, 0.0])
+    assert cache.get_similar([0.0, 1.0, 0.0], (3,)) is None
+
+    cache.set("what is a subnet", "subnet", params=(3,), embedding=[0.0, 1.0, 0.0])
+    assert cache.get_similar([0.0, 1.0, 0.0], (3,)) == "subnet"
+    assert cache.get_similar([1.0, 0.0, 0.0], (3,)) == "vpc"
+
+
+def test_similar_match_skips_expired():
+    """Test expired entries are not returned by similarity lookups"""
+    cache = SemanticCache(ttl=0.05)
+    cache.set("what is a vpc", "answer", embedding=[1.0, 0.0])
+    assert cache.get_similar([1.0, 0.0]) == "answer"
+
+    time.sleep(0.1)
+    assert cache.get_similar([1.0, 0.0]) is None